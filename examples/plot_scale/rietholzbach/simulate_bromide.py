@@ -20,6 +20,15 @@ df_prec = pd.read_csv(file, sep="\t", skiprows=0, na_values=-9999,
                      parse_dates=True, index_col=0)
 df_prec.index = pd.to_datetime(df_prec.index)
 
+# transfer functions and parameters of the transport models
+models = {
+    "dispersion": (transep.dispersion_function, dict(p_d=0.1, mtt=100)),
+    "exponential_piston": (transep.exponential_piston_function, dict(mtt=10, eta=0.1)),
+    "gamma": (transep.gamma_function, dict(alpha=1, beta=10)),
+    "linear_reservoir": (transep.linear_reservoir_function, dict(mtt=40)),
+    "parallel_linear_reservoir": (transep.parallel_linear_reservoir_function, dict(mtt_slow=100, mtt_fast=10, frac_fast=0.1)),
+}
+
 for year in years:
     # generate bromide input data
     df_prec_year = df_prec.loc[str(year):str(year+1)]
@@ -40,67 +49,15 @@ for year in years:
     ]
     df_in.to_csv(base_path_input / f"bromide_in_{year}.csv", sep=";")
 
-    # simulate with dispersion transfer function
-    output = transep.simulate(input, transep.dispersion_function, 1, p_d=0.1, mtt=100)
-    output = output / 79.904  # convert from mg/l to mmol/l
-    output1 = transep.simulate_explicit(input, transep.dispersion_function, 1, p_d=0.1, mtt=100)
-    df_output = pd.DataFrame(output, index=df_in.index, columns=['Br'])
-    df_output.columns = [
-        ["mmol/l"],
-        ["Br"],
-    ]
-    # write output to csv
-    file = base_path_output / f"bromide_time_series_dispersion_{year}.csv"
-    df_output.to_csv(file, sep=";")
-
-    # simulate with exponential piston function
-    output = transep.simulate(input, transep.exponential_piston_function, 1, mtt=10, eta=0.1)
-    output = output / 79.904  # convert from mg/l to mmol/l
-    output1 = transep.simulate_explicit(input, transep.exponential_piston_function, 1, mtt=10, eta=0.1)
-    df_output = pd.DataFrame(output, index=df_in.index, columns=['Br'])
-    df_output.columns = [
-        ["mmol/l"],
-        ["Br"],
-    ]
-    # write output to csv
-    file = base_path_output / f"bromide_time_series_exponential_piston_{year}.csv"
-    df_output.to_csv(file, sep=";")
-
-    # simulate with gamma transfer function
-    output = transep.simulate(input, transep.gamma_function, 1, alpha=1, beta=10)
-    output = output / 79.904  # convert from mg/l to mmol/l
-    output1 = transep.simulate_explicit(input, transep.gamma_function, 1, alpha=1, beta=10)
-    df_output = pd.DataFrame(output, index=df_in.index, columns=['Br'])
-    df_output.columns = [
-        ["mmol/l"],
-        ["Br"],
-    ]
-    # write output to csv
-    file = base_path_output / f"bromide_time_series_gamma_{year}.csv"
-    df_output.to_csv(file, sep=";")
-
-    # simulate with linear reservoir transfer function
-    output = transep.simulate(input, transep.linear_reservoir_function, 1, mtt=40)
-    output = output / 79.904  # convert from mg/l to mmol/l
-    output1 = transep.simulate_explicit(input, transep.linear_reservoir_function, 1, mtt=40)
-    df_output = pd.DataFrame(output, index=df_in.index, columns=['Br'])
-    df_output.columns = [
-        ["mmol/l"],
-        ["Br"],
-    ]
-    # write output to csv
-    file = base_path_output / f"bromide_time_series_linear_reservoir_{year}.csv"
-    df_output.to_csv(file, sep=";")
-
-    # simlate with parallel linear reservoir transfer function
-    output = transep.simulate(input, transep.parallel_linear_reservoir_function, 1, mtt_slow=100, mtt_fast=10, frac_fast=0.1)
-    output = output / 79.904  # convert from mg/l to mmol/l
-    output1 = transep.simulate(input, transep.parallel_linear_reservoir_function, 1, mtt_slow=100, mtt_fast=10, frac_fast=0.1)
-    df_output = pd.DataFrame(output, index=df_in.index, columns=['Br'])
-    df_output.columns = [
-        ["mmol/l"],
-        ["Br"],
-    ]
-    # write output to csv
-    file = base_path_output / f"bromide_time_series_parallel_linear_reservoir_{year}.csv"
-    df_output.to_csv(file, sep=";")
\ No newline at end of file
+    # simulate all transport models at once
+    outputs = transep.simulate_models(input, 1, models)
+    for name, output in outputs.items():
+        output = output / 79.904  # convert from mg/l to mmol/l
+        df_output = pd.DataFrame(output, index=df_in.index, columns=['Br'])
+        df_output.columns = [
+            ["mmol/l"],
+            ["Br"],
+        ]
+        # write output to csv
+        file = base_path_output / f"bromide_time_series_{name}_{year}.csv"
+        df_output.to_csv(file, sep=";")
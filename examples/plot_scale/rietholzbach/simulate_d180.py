@@ -21,62 +21,23 @@ input_mod = df_in_mod['d18O'].bfill().ffill().values
 # time steps
 t = np.arange(1, len(input_mod) + 1)
 
-# simulate with dispersion transfer function
-output = transep.simulate(input_mod, transep.dispersion_function, 1, p_d=0.1, mtt=100)
-output1 = transep.simulate_explicit(input_mod, transep.dispersion_function, 1, p_d=0.1, mtt=100)
-df_output = pd.DataFrame(output, index=df_in_mod.index, columns=['d18O'])
-df_output.columns = [
-    ["per mille"],
-    ["d18O"],
-]
-# write output to csv
-file = base_path_output / "oxygen18_time_series_dispersion.csv"
-df_output.to_csv(file, sep=";")
-
-# simulate with exponential piston function
-output = transep.simulate(input_mod, transep.exponential_piston_function, 1, mtt=10, eta=0.1)
-output1 = transep.simulate_explicit(input_mod, transep.exponential_piston_function, 1, mtt=10, eta=0.1)
-df_output = pd.DataFrame(output, index=df_in_mod.index, columns=['d18O'])
-df_output.columns = [
-    ["per mille"],
-    ["d18O"],
-]
-# write output to csv
-file = base_path_output / "oxygen18_time_series_exponential_piston.csv"
-df_output.to_csv(file, sep=";")
-
-# simulate with gamma transfer function
-output = transep.simulate(input_mod, transep.gamma_function, 1, alpha=1, beta=10)
-output1 = transep.simulate_explicit(input_mod, transep.gamma_function, 1, alpha=1, beta=10)
-df_output = pd.DataFrame(output, index=df_in_mod.index, columns=['d18O'])
-df_output.columns = [
-    ["per mille"],
-    ["d18O"],
-]
-# write output to csv
-file = base_path_output / "oxygen18_time_series_gamma.csv"
-df_output.to_csv(file, sep=";")
-
-# simulate with linear reservoir transfer function
-output = transep.simulate(input_mod, transep.linear_reservoir_function, 1, mtt=40)
-output1 = transep.simulate_explicit(input_mod, transep.linear_reservoir_function, 1, mtt=40)
-df_output = pd.DataFrame(output, index=df_in_mod.index, columns=['d18O'])
-df_output.columns = [
-    ["per mille"],
-    ["d18O"],
-]
-# write output to csv
-file = base_path_output / "oxygen18_time_series_linear_reservoir.csv"
-df_output.to_csv(file, sep=";")
-
-# simlate with parallel linear reservoir transfer function
-output = transep.simulate(input_mod, transep.parallel_linear_reservoir_function, 1, mtt_slow=100, mtt_fast=10, frac_fast=0.1)
-output1 = transep.simulate(input_mod, transep.parallel_linear_reservoir_function, 1, mtt_slow=100, mtt_fast=10, frac_fast=0.1)
-df_output = pd.DataFrame(output, index=df_in_mod.index, columns=['d18O'])
-df_output.columns = [
-    ["per mille"],
-    ["d18O"],
-]
-# write output to csv
-file = base_path_output / "oxygen18_time_series_parallel_linear_reservoir.csv"
-df_output.to_csv(file, sep=";")
\ No newline at end of file
+# transfer functions and parameters of the transport models
+models = {
+    "dispersion": (transep.dispersion_function, dict(p_d=0.1, mtt=100)),
+    "exponential_piston": (transep.exponential_piston_function, dict(mtt=10, eta=0.1)),
+    "gamma": (transep.gamma_function, dict(alpha=1, beta=10)),
+    "linear_reservoir": (transep.linear_reservoir_function, dict(mtt=40)),
+    "parallel_linear_reservoir": (transep.parallel_linear_reservoir_function, dict(mtt_slow=100, mtt_fast=10, frac_fast=0.1)),
+}
+
+# simulate all transport models at once
+outputs = transep.simulate_models(input_mod, 1, models)
+for name, output in outputs.items():
+    df_output = pd.DataFrame(output, index=df_in_mod.index, columns=['d18O'])
+    df_output.columns = [
+        ["per mille"],
+        ["d18O"],
+    ]
+    # write output to csv
+    file = base_path_output / f"oxygen18_time_series_{name}.csv"
+    df_output.to_csv(file, sep=";")
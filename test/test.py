@@ -1,6 +1,7 @@
 import pytest
-from transep import transep
+from transep import transep, cache, calibrate, composite, convolution, model, parallel, recursive
 import numpy as np
+from scipy import stats
 
 
 input = np.zeros((3,))
@@ -15,24 +16,652 @@ def input():
 
 def test_dm(input):
     output = transep.simulate(input, transep.dispersion_function, 1, p_d=0.1, mtt=10)
-    assert output == pytest.approx(np.array([0., 0.10346571, 0.00252264]), rel=1e-4)
+    assert output == pytest.approx(np.array([1.35847942e-07, 1.00372669e-02, 2.74451309e-01]), rel=1e-4)
 
 
 def test_epm(input):
     output = transep.simulate(input, transep.exponential_piston_function, 1, mtt=100, eta=0.1)
-    assert output == pytest.approx(np.array([0., 0.01219697, 0.01219587]), rel=1e-4)
+    assert output == pytest.approx(np.array([0.0121849, 0.01217272, 0.01216055]), rel=1e-4)
 
 
 def test_gm(input):
     output = transep.simulate(input, transep.gamma_function, 1, alpha=1, beta=1)
-    assert output == pytest.approx(np.array([0., 1.49361205, 4.0600585]), rel=1e-4)
+    assert output == pytest.approx(np.array([11.03638324, 4.0600585, 1.49361205]), rel=1e-4)
 
 
 def test_lrm(input):
     output = transep.simulate(input, transep.linear_reservoir_function, 1, mtt=40)
-    assert output == pytest.approx(np.array([0., 0.69580761, 0.71342207]), rel=1e-4)
+    assert output == pytest.approx(np.array([0.73148243, 0.71342207, 0.69580761]), rel=1e-4)
 
 
 def test_plrm(input):
     output = transep.simulate(input, transep.parallel_linear_reservoir_function, 1, mtt_slow=60, mtt_fast=10, frac_fast=0.1)
-    assert output == pytest.approx(np.array([0., 28.71156673, 29.21374144]), rel=1e-4)
+    assert output == pytest.approx(np.array([0.71401338, 0.68086647, 0.65029871]), rel=1e-4)
+
+
+@pytest.mark.parametrize("method", ["direct", "fft", "overlap-add", "auto"])
+def test_convolution_methods(method):
+    rng = np.random.default_rng(42)
+    arr = rng.random(500)
+    output = transep.simulate(arr, transep.dispersion_function, 1, method=method, p_d=0.1, mtt=10)
+    t = np.arange(1, len(arr) + 1)
+    expected = np.convolve(arr, transep.dispersion_function(t, p_d=0.1, mtt=10))[:len(arr)]
+    assert output == pytest.approx(expected, rel=1e-8, abs=1e-12)
+
+
+def test_choose_method():
+    assert convolution.choose_method(100, 5) == "direct"
+    assert convolution.choose_method(100000, 100000) in ("fft", "overlap-add")
+    assert convolution.convolution_cost(100000, 50, "direct") < convolution.convolution_cost(100000, 100000, "direct")
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.linear_reservoir_function, dict(mtt=40)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=60, mtt_fast=10, frac_fast=0.1)),
+])
+def test_recursive_engine(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(2000)
+    output = transep.simulate(arr, g, 0.5, engine="recursive", **kwargs)
+    expected = transep.simulate(arr, g, 0.5, engine="convolution", method="direct", **kwargs)
+    assert output == pytest.approx(expected, rel=1e-10)
+    assert transep._select_engine(g, **kwargs) == "recursive"
+
+
+def test_recursive_engine_unavailable(input):
+    with pytest.raises(ValueError):
+        transep.simulate(input, transep.dispersion_function, 1, engine="recursive", p_d=0.1, mtt=10)
+
+
+@pytest.mark.parametrize("alpha, beta", [(1, 10), (3, 10), (8, 40), (2.5, 10)])
+def test_cascade_engine(alpha, beta):
+    rng = np.random.default_rng(42)
+    arr = rng.random(2000)
+    output = transep.simulate(arr, transep.gamma_function, 1, engine="cascade", alpha=alpha, beta=beta)
+    expected = transep.simulate(arr, transep.gamma_function, 1, engine="convolution", alpha=alpha, beta=beta)
+    assert output == pytest.approx(expected, rel=1e-9)
+
+
+def test_gamma_function_normalized():
+    t = np.arange(1, 10001, dtype=float)
+    assert np.sum(transep.gamma_function(t, alpha=3, beta=10)) == pytest.approx(1, rel=1e-3)
+
+
+@pytest.mark.parametrize("alpha, beta", [(0.5, 10), (2.5, 10), (8, 40)])
+def test_gamma_function(alpha, beta):
+    t = np.arange(1, 3001, dtype=float)
+    expected = stats.gamma.pdf(t, alpha, scale=beta)
+    assert transep.gamma_function(t, alpha=alpha, beta=beta) == pytest.approx(expected, rel=1e-10)
+
+
+@pytest.mark.parametrize("mtt, eta", [(10, 1), (40, 1.5), (37.3, 2.7)])
+def test_exponential_piston_function(mtt, eta):
+    dt = 0.01
+    t = np.arange(dt / 2, 50 * mtt, dt)
+    gout = transep.exponential_piston_function(t, mtt=mtt, eta=eta)
+    assert np.sum(gout) * dt == pytest.approx(1, rel=1e-3)
+    assert np.sum(t * gout) * dt == pytest.approx(mtt, rel=1e-3)
+
+
+@pytest.mark.parametrize("mtt, eta", [(10, 1), (40, 1.5), (37.3, 2.7), (100, 0.1), (10, 50)])
+def test_delay_engine(mtt, eta):
+    rng = np.random.default_rng(42)
+    arr = rng.random(2000)
+    output = transep.simulate(arr, transep.exponential_piston_function, 1, engine="delay", mtt=mtt, eta=eta)
+    expected = transep.simulate(arr, transep.exponential_piston_function, 1, engine="convolution", mtt=mtt, eta=eta)
+    assert output == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.dispersion_function, dict(p_d=0.1, mtt=10)),
+    (transep.exponential_piston_function, dict(mtt=10, eta=1.5)),
+    (transep.gamma_function, dict(alpha=2, beta=10)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=60, mtt_fast=10, frac_fast=0.1)),
+])
+def test_simulate_multiple_sites(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random((4, 300))
+    output = transep.simulate(arr, g, 1, **kwargs)
+    assert output.shape == arr.shape
+    for row, out_row in zip(arr, output):
+        assert out_row == pytest.approx(transep.simulate(row, g, 1, **kwargs), rel=1e-9, abs=1e-12)
+
+    ragged = [arr[0], arr[1, :100], arr[2, :250]]
+    output = transep.simulate(ragged, g, 1, **kwargs)
+    assert [len(out_row) for out_row in output] == [300, 100, 250]
+    for row, out_row in zip(ragged, output):
+        assert out_row == pytest.approx(transep.simulate(row, g, 1, **kwargs), rel=1e-9, abs=1e-12)
+
+
+def test_batched_transfer_function():
+    t = np.arange(1, 101, dtype=float)
+    mtt = np.array([10., 20., 40.])
+    gout = transep.dispersion_function(t, p_d=0.1, mtt=mtt)
+    assert gout.shape == (3, 100)
+    for i in range(3):
+        assert gout[i] == pytest.approx(transep.dispersion_function(t, p_d=0.1, mtt=mtt[i]))
+
+
+@pytest.mark.parametrize("g, params", [
+    (transep.dispersion_function, dict(p_d=np.array([0.05, 0.1, 0.2]), mtt=np.array([10, 20, 40]))),
+    (transep.gamma_function, dict(alpha=np.array([1, 2.5, 3]), beta=10)),
+    (transep.exponential_piston_function, dict(mtt=np.array([10, 20]), eta=np.array([1.2, 2]))),
+    (transep.exponential_piston_function, dict(mtt=np.array([10, 20]), eta=np.array([1, 2]))),
+    (transep.exponential_piston_function, dict(mtt=[10, 20], eta=[1, 2])),
+])
+def test_simulate_batch(g, params):
+    rng = np.random.default_rng(42)
+    arr = rng.random(500)
+    output = transep.simulate_batch(arr, g, 1, params, batch_size=2)
+    params = transep._batch_parameters(params)
+    n_params = len(next(iter(params.values())))
+    assert output.shape == (n_params, 500)
+    for i in range(n_params):
+        expected = transep.simulate(arr, g, 1, **{name: value[i] for name, value in params.items()})
+        assert output[i] == pytest.approx(expected, rel=1e-8, abs=1e-12)
+    # array-valued parameters are convolved row-wise by simulate
+    assert transep.simulate(arr, g, 1, **params) == pytest.approx(output, rel=1e-8, abs=1e-12)
+
+
+def test_integer_parameters():
+    rng = np.random.default_rng(42)
+    arr = rng.random(500)
+    t = np.arange(1, 501, dtype=float)
+    gout = transep.exponential_piston_function(t, mtt=np.array([10, 20]), eta=np.array([1, 2]))
+    assert gout[1] == pytest.approx(transep.exponential_piston_function(t, mtt=20., eta=2.))
+    output = transep.simulate(arr, transep.exponential_piston_function, 1, mtt=np.int64(20), eta=np.int64(2))
+    assert output == pytest.approx(transep.simulate(arr, transep.exponential_piston_function, 1, mtt=20., eta=2.))
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.dispersion_function, dict(p_d=0.1, mtt=10)),
+    (transep.exponential_piston_function, dict(mtt=40, eta=1.5)),
+    (transep.gamma_function, dict(alpha=2.5, beta=10)),
+    (transep.linear_reservoir_function, dict(mtt=40)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=60, mtt_fast=10, frac_fast=0.1)),
+])
+def test_truncation(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(5000)
+    tol = 1e-6
+    output, info = transep.simulate(arr, g, 1, engine="convolution", tol=tol, full_output=True, **kwargs)
+    expected = transep.simulate(arr, g, 1, engine="convolution", **kwargs)
+    assert info["n_kernel"] < len(arr)
+    assert 0 <= info["dropped_mass"] <= tol
+    assert np.max(np.abs(output - expected)) <= tol * np.max(arr)
+
+
+def test_sparse_convolution():
+    arr = np.zeros(4000)
+    arr[313:320] = 25.
+    output, info = transep.simulate(arr, transep.dispersion_function, 1, full_output=True, p_d=0.1, mtt=100)
+    assert info["method"] == "sparse"
+    expected = transep.simulate(arr, transep.dispersion_function, 1, method="direct", p_d=0.1, mtt=100)
+    assert output == pytest.approx(expected, rel=1e-10, abs=1e-14)
+    arr2 = np.stack([arr, np.roll(arr, 100)])
+    output = transep.simulate(arr2, transep.dispersion_function, 1, method="sparse", p_d=0.1, mtt=100)
+    expected = transep.simulate(arr2, transep.dispersion_function, 1, method="fft", p_d=0.1, mtt=100)
+    assert output == pytest.approx(expected, rel=1e-8, abs=1e-12)
+
+
+def test_explicit_convolution():
+    rng = np.random.default_rng(42)
+    arr = rng.random(1500)
+    flux = rng.random(1500)
+    output = transep.simulate_explicit(arr, transep.dispersion_function, 0.5, p_d=0.1, mtt=10)
+    expected = transep.simulate(arr, transep.dispersion_function, 0.5, method="direct", p_d=0.1, mtt=10)
+    assert output == pytest.approx(expected, rel=1e-10, abs=1e-14)
+    output = transep.simulate_explicit(arr, transep.dispersion_function, 0.5, weight=flux, p_d=0.1, mtt=10)
+    expected = transep.simulate(arr * flux, transep.dispersion_function, 0.5, method="direct", p_d=0.1, mtt=10)
+    assert output == pytest.approx(expected, rel=1e-10, abs=1e-14)
+
+
+def _loss_function_loop(prec, b1, b2, b3):
+    s_t = np.zeros((len(prec),))
+    for t in range(len(prec)):
+        if t == 0:
+            s_t[t] = b1 * prec[t] + (1 - b2**-1) * b3
+        else:
+            s_t[t] = b1 * prec[t] + (1 - b2**-1) * s_t[t-1]
+    return prec * s_t
+
+
+@pytest.mark.parametrize("n_params", [3, 5000])
+def test_loss_function_batch(n_params):
+    rng = np.random.default_rng(42)
+    prec = rng.exponential(2, size=(2, 300)) * (rng.random((2, 300)) > 0.6)
+    b1, b2, b3 = rng.random(n_params), 1 + 2 * rng.random(n_params), 10 * rng.random(n_params)
+    prec_eff = transep.loss_function_batch(prec, b1, b2, b3)
+    assert prec_eff.shape == (n_params, 2, 300)
+    for i in range(n_params):
+        for j in range(2):
+            assert np.array_equal(prec_eff[i, j], transep.loss_function(prec[j], b1[i], b2[i], b3[i]))
+    for i in [0, n_params - 1]:
+        for j in range(2):
+            assert np.array_equal(prec_eff[i, j], _loss_function_loop(prec[j], b1[i], b2[i], b3[i]))
+
+
+@pytest.mark.parametrize("block_size", [None, 64])
+def test_simulate_stream(block_size):
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    bounds = np.unique(np.concatenate(([0, 1, 2], rng.integers(0, 3000, 20), [3000])))
+    chunks = (arr[start:stop] for start, stop in zip(bounds[:-1], bounds[1:]))
+    output = list(transep.simulate_stream(chunks, transep.dispersion_function, 1, 3000,
+                                          block_size=block_size, p_d=0.1, mtt=100))
+    assert [len(out) for out in output] == list(np.diff(bounds))
+    expected = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=100)
+    assert np.concatenate(output) == pytest.approx(expected, rel=1e-8, abs=1e-12)
+
+
+@pytest.mark.parametrize("block_size", [None, 64])
+def test_simulate_stream_sites(block_size):
+    rng = np.random.default_rng(42)
+    arr = rng.random((3, 3000))
+    bounds = np.unique(np.concatenate(([0, 1, 2], rng.integers(0, 3000, 20), [3000])))
+    chunks = (arr[:, start:stop] for start, stop in zip(bounds[:-1], bounds[1:]))
+    output = list(transep.simulate_stream(chunks, transep.dispersion_function, 1, 3000,
+                                          block_size=block_size, p_d=0.1, mtt=100))
+    assert [out.shape for out in output] == [(3, n) for n in np.diff(bounds)]
+    expected = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=100)
+    assert np.concatenate(output, axis=-1) == pytest.approx(expected, rel=1e-8, abs=1e-12)
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.dispersion_function, dict(p_d=0.1, mtt=10)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=60, mtt_fast=10, frac_fast=0.1)),
+])
+def test_transfer_model(g, kwargs, tmp_path):
+    rng = np.random.default_rng(42)
+    arr = rng.random(1000)
+    expected = transep.simulate(arr, g, 1, **kwargs)
+    transfer_model = model.TransferModel(g, 1, 1000, **kwargs)
+    output = [transfer_model.update(arr[:500])]
+    transfer_model.save(tmp_path / "state.json")
+    transfer_model = model.TransferModel.load(tmp_path / "state.json")
+    output += [transfer_model.update(value) for value in arr[500:700]]
+    output.append(transfer_model.update(arr[700:]))
+    assert transfer_model.n_steps == 1000
+    assert np.concatenate(output) == pytest.approx(expected, rel=1e-8, abs=1e-12)
+
+
+@pytest.mark.parametrize("method", ["direct", "fft", "auto"])
+def test_plan(method):
+    rng = np.random.default_rng(42)
+    arr = rng.random((3, 2000))
+    simulation_plan = transep.plan(2000, transep.dispersion_function, 0.5, method=method, p_d=0.1, mtt=100)
+    out = np.zeros(2000)
+    for row in arr:
+        output = simulation_plan.run(row, out=out)
+        assert output is out
+        expected = transep.simulate(row, transep.dispersion_function, 0.5, p_d=0.1, mtt=100)
+        assert output == pytest.approx(expected, rel=1e-8, abs=1e-12)
+    expected = transep.simulate(arr, transep.dispersion_function, 0.5, p_d=0.1, mtt=100)
+    assert simulation_plan.run(arr) == pytest.approx(expected, rel=1e-8, abs=1e-12)
+
+
+def test_kernel_cache():
+    rng = np.random.default_rng(42)
+    arr = rng.random(1000)
+    kernel_cache = cache.enable_cache(max_bytes=2 * 1000 * 8)
+    try:
+        expected = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=10)
+        output = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=10)
+        assert output == pytest.approx(expected)
+        assert kernel_cache.info()["hits"] == 1 and kernel_cache.info()["misses"] == 1
+        gout, _ = transep.truncate_kernel(transep.dispersion_function, 1000, p_d=0.1, mtt=10)
+        assert not gout.flags.writeable
+        assert gout is transep.truncate_kernel(transep.dispersion_function, 1000, p_d=0.1, mtt=10)[0]
+        transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=20)
+        transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=30)
+        assert kernel_cache.info()["evictions"] == 1
+        assert kernel_cache.nbytes <= kernel_cache.max_bytes
+    finally:
+        cache.disable_cache()
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.dispersion_function, dict(p_d=0.1, mtt=40)),
+    (transep.exponential_piston_function, dict(mtt=40, eta=1.5)),
+    (transep.gamma_function, dict(alpha=3, beta=10)),
+    (transep.gamma_function, dict(alpha=2.5, beta=10)),
+    (transep.linear_reservoir_function, dict(mtt=40)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=60, mtt_fast=10, frac_fast=0.1)),
+])
+def test_spectral_engine(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    output = transep.simulate(arr, g, 1, engine="spectral", **kwargs)
+    expected = transep.simulate(arr, g, 1, engine="convolution", **kwargs)
+    assert output == pytest.approx(expected, rel=1e-6, abs=1e-6 * np.max(expected))
+
+
+def test_simulate_batch_spectral():
+    rng = np.random.default_rng(42)
+    arr = rng.random(1000)
+    params = dict(p_d=np.array([0.05, 0.1, 0.2]), mtt=np.array([10, 20, 40]))
+    output = transep.simulate_batch(arr, transep.dispersion_function, 1, params, spectral=True)
+    expected = transep.simulate_batch(arr, transep.dispersion_function, 1, params)
+    assert output == pytest.approx(expected, rel=1e-6, abs=1e-9)
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.linear_reservoir_function, dict(mtt=5000)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=6000, mtt_fast=10, frac_fast=0.3)),
+    (transep.exponential_piston_function, dict(mtt=5000, eta=1.2)),
+    (transep.gamma_function, dict(alpha=2, beta=2000)),
+    (transep.gamma_function, dict(alpha=2.5, beta=2000)),
+    (transep.dispersion_function, dict(p_d=0.3, mtt=4000)),
+])
+def test_spectral_engine_long_kernel(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    expected = transep.simulate(arr, g, 1, engine="convolution", **kwargs)
+    output = transep.simulate(arr, g, 1, engine="spectral", **kwargs)
+    assert output == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    params = {name: [value] for name, value in kwargs.items()}
+    output = transep.simulate_batch(arr, g, 1, params, spectral=True)
+    assert output[0] == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.linear_reservoir_function, dict(mtt=np.array([5., 50., 5000.]))),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=np.array([60., 6000.]), mtt_fast=10, frac_fast=0.3)),
+    (transep.exponential_piston_function, dict(mtt=np.array([10., 40., 500.]), eta=np.array([1., 1.5, 3.]))),
+    (transep.dispersion_function, dict(p_d=0.1, mtt=np.array([40., 4000.]))),
+])
+@pytest.mark.parametrize("nfft", [255, 256])
+def test_kernel_spectrum(g, kwargs, nfft):
+    t = np.arange(1, 101, dtype=float)
+    expected = np.fft.rfft(g(t, **kwargs), nfft, axis=-1)
+    assert transep.kernel_spectrum(g, nfft, 100, **kwargs) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_gamma_spectrum_batch():
+    t = np.arange(1, 4097, dtype=float)
+    omega = 2 * np.pi * np.fft.rfftfreq(len(t))
+    alpha, beta = np.array([1, 2.5, 3, 4.5]), np.array([10, 20, 5, 30])
+    output = transep.gamma_spectrum(omega, alpha=alpha, beta=beta)
+    expected = np.fft.rfft(transep.gamma_function(t, alpha=alpha, beta=beta), axis=-1)
+    assert output == pytest.approx(expected, rel=1e-6, abs=1e-9)
+
+
+@pytest.mark.parametrize("alpha, beta", [(0.3, 5), (0.5, 5)])
+def test_spectral_engine_small_shape(alpha, beta):
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    assert transep._spectrum_function(transep.gamma_function, alpha=alpha, beta=beta) is None
+    with pytest.raises(ValueError):
+        transep.gamma_spectrum(np.zeros(3), alpha=alpha, beta=beta)
+    output = transep.simulate(arr, transep.gamma_function, 1, engine="spectral", alpha=alpha, beta=beta)
+    expected = transep.simulate(arr, transep.gamma_function, 1, engine="convolution", alpha=alpha, beta=beta)
+    assert output == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("p_d, mtt", [(0.1, 40), (0.05, 200), (0.5, 60)])
+def test_dispersion_function_normalized(p_d, mtt):
+    t = np.arange(1, 100 * mtt + 1, dtype=float)
+    gout = transep.dispersion_function(t, p_d=p_d, mtt=mtt)
+    assert np.sum(gout) == pytest.approx(1, rel=1e-6)
+    assert np.sum(t * gout) == pytest.approx(mtt, rel=1e-6)
+
+
+def test_mixture():
+    rng = np.random.default_rng(42)
+    arr = rng.random(2000)
+    parts = [(transep.dispersion_function, dict(p_d=0.1, mtt=40)),
+             (transep.gamma_function, dict(alpha=2, beta=10)),
+             (transep.linear_reservoir_function, dict(mtt=5))]
+    g = composite.Mixture(parts, weights=[0.3, 0.5, 0.2])
+    output, info = transep.simulate(arr, g, 2, full_output=True)
+    expected = sum(w * transep.simulate(arr, f, 2, engine="convolution", **params)
+                   for w, (f, params) in zip([0.3, 0.5, 0.2], parts))
+    assert info["engine"] == "composite"
+    assert output == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    assert transep.simulate(arr, g, 2, engine="convolution") == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_series():
+    rng = np.random.default_rng(42)
+    arr = rng.random(2000)
+    parts = [(transep.exponential_piston_function, dict(mtt=20, eta=2)),
+             (transep.gamma_function, dict(alpha=2.5, beta=10)),
+             (transep.dispersion_function, dict(p_d=0.1, mtt=30))]
+    g = composite.Series(parts)
+    expected = arr
+    for f, params in parts:
+        expected = transep.simulate(expected, f, 1, engine="convolution", **params)
+    assert transep.simulate(arr, g, 1, engine="convolution") == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    output, info = transep.simulate(arr, g, 1, full_output=True)
+    assert info["engine"] == "composite"
+    assert output == pytest.approx(expected, rel=1e-6, abs=1e-6 * np.max(expected))
+
+
+def test_series_long_kernel():
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    g = composite.Series([(transep.gamma_function, dict(alpha=2.5, beta=500)),
+                          (transep.dispersion_function, dict(p_d=0.2, mtt=2000))])
+    expected = transep.simulate(arr, g, 1, engine="convolution")
+    assert transep.simulate(arr, g, 1) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    assert transep.simulate(arr, g, 1, engine="spectral") == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.dispersion_function, dict(p_d=0.1, mtt=40)),
+    (transep.gamma_function, dict(alpha=2.5, beta=10)),
+    (transep.gamma_function, dict(alpha=0.5, beta=30)),
+])
+def test_prony_engine(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(5000)
+    gout, _ = transep.truncate_kernel(g, len(arr), **kwargs)
+    weights, ratios, error = transep.fit_exponential_sum(g, len(arr), tol=1e-3, **kwargs)
+    assert len(ratios) <= 20
+    approx = recursive.exponential_filter(np.eye(1, len(arr))[0], weights, ratios)
+    assert np.sum(np.abs(approx - gout)) <= error <= 1e-3
+    output = transep.simulate(arr, g, 1, engine="prony", tol=1e-3, **kwargs)
+    expected = transep.simulate(arr, g, 1, engine="convolution", **kwargs)
+    # the output error is bounded by the L1 error of the transfer function
+    assert np.max(np.abs(output - expected)) <= error * np.max(arr)
+
+
+def _slow_exponential(tau):
+    return np.exp(-tau / 5000) / 5000
+
+
+def test_prony_slow_exponential():
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    weights, ratios, error = transep.fit_exponential_sum(_slow_exponential, len(arr))
+    assert len(ratios) == 1 and error < 1e-10
+    output = transep.simulate(arr, _slow_exponential, 1, engine="prony")
+    expected = transep.simulate(arr, _slow_exponential, 1, engine="convolution")
+    assert output == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.parametrize("kwargs", [dict(), dict(mtt=40, eta=1.5)])
+def test_prony_delay(kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(100)
+    output = transep.simulate(arr, transep.exponential_piston_function, 1, engine="prony", **kwargs)
+    expected = transep.simulate(arr, transep.exponential_piston_function, 1, engine="convolution", **kwargs)
+    assert output == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_prony_fit_failure(monkeypatch):
+    def fail(kernel, tol=1e-3, max_terms=20):
+        raise np.linalg.LinAlgError("SVD did not converge")
+
+    monkeypatch.setattr(recursive, "fit_exponentials", fail)
+    arr = np.random.default_rng(42).random(200)
+    output = transep.prony_integral(arr, transep.gamma_function, 1, alpha=2.5, beta=20)
+    expected = transep.simulate(arr, transep.gamma_function, 1, engine="convolution", alpha=2.5, beta=20)
+    assert output == pytest.approx(expected)
+
+
+def test_prony_fit_cached():
+    transep._cached_fit.cache_clear()
+    weights, ratios, _ = transep.fit_exponential_sum(transep.dispersion_function, 5000, p_d=0.1, mtt=40)
+    cached_weights, cached_ratios, _ = transep.fit_exponential_sum(transep.dispersion_function, 5000, p_d=0.1, mtt=40)
+    assert cached_weights is weights and cached_ratios is ratios
+    assert not weights.flags.writeable
+    assert transep._cached_fit.cache_info().hits == 1
+
+
+@pytest.mark.parametrize("n_obs", [20, 2000])
+def test_simulate_at(n_obs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(4000)
+    mask = np.zeros(4000, dtype=bool)
+    mask[rng.choice(4000, n_obs, replace=False)] = True
+    expected = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.1, mtt=40)
+    output, info = transep.simulate(arr, transep.dispersion_function, 1, full_output=True, at=mask, p_d=0.1, mtt=40)
+    assert info["method"] == ("dot" if n_obs == 20 else "fft")
+    assert output == pytest.approx(expected[mask], rel=1e-9, abs=1e-12)
+    index = np.flatnonzero(mask)
+    output = transep.simulate(arr[np.newaxis], transep.dispersion_function, 1, at=index, p_d=0.1, mtt=40)
+    assert output[0] == pytest.approx(expected[mask], rel=1e-9, abs=1e-12)
+    output = transep.simulate(arr, transep.linear_reservoir_function, 1, at=index, mtt=40)
+    assert output == pytest.approx(transep.simulate(arr, transep.linear_reservoir_function, 1, mtt=40)[index])
+
+
+@pytest.mark.parametrize("g, kwargs", [
+    (transep.dispersion_function, dict(p_d=0.1, mtt=40)),
+    (transep.linear_reservoir_function, dict(mtt=40)),
+])
+def test_simulate_window(g, kwargs):
+    rng = np.random.default_rng(42)
+    arr = rng.random(10000)
+    expected = transep.simulate(arr, g, 1, **kwargs)
+    output = transep.simulate(arr, g, 1, window=(5000, 5365), **kwargs)
+    assert output == pytest.approx(expected[5000:5365], rel=1e-9, abs=1e-12)
+    output, info = transep.simulate(arr, g, 1, tol=1e-8, full_output=True, window=(-365, None), **kwargs)
+    assert output == pytest.approx(expected[-365:], rel=1e-6, abs=1e-9)
+    assert len(transep.simulate(arr, g, 1, window=(100, 100), **kwargs)) == 0
+
+
+def test_simulate_models():
+    rng = np.random.default_rng(42)
+    arr = rng.random(1000)
+    models = {
+        "dm": (transep.dispersion_function, dict(p_d=0.1, mtt=100)),
+        "epm": (transep.exponential_piston_function, dict(mtt=10, eta=1.5)),
+        "gm": (transep.gamma_function, dict(alpha=2.5, beta=10)),
+        "lrm": (transep.linear_reservoir_function, dict(mtt=40)),
+        "plrm": (transep.parallel_linear_reservoir_function, dict(mtt_slow=100, mtt_fast=10, frac_fast=0.1)),
+    }
+    output = transep.simulate_models(arr, 1, models)
+    assert list(output) == list(models)
+    for name, (g, params) in models.items():
+        assert output[name] == pytest.approx(transep.simulate(arr, g, 1, **params), rel=1e-9, abs=1e-12)
+
+
+def test_monte_carlo():
+    rng = np.random.default_rng(42)
+    arr = rng.random(2000)
+    obs = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.2, mtt=60)
+    obs[rng.random(2000) < 0.9] = np.nan
+    mask = np.isfinite(obs)
+    bounds = dict(p_d=(0.05, 0.5), mtt=(10, 200))
+    result = calibrate.monte_carlo(arr, obs, transep.dispersion_function, bounds, n=500, objective="nse",
+                                   threshold=0.5, batch_size=64, seed=42)
+    assert result["throughput"] > 0
+    for i in [0, 100, 499]:
+        sim = transep.simulate(arr, transep.dispersion_function, 1, p_d=result["params"]["p_d"][i],
+                               mtt=result["params"]["mtt"][i])
+        for name in calibrate.OBJECTIVES:
+            expected = getattr(calibrate, name)(sim[mask], obs[mask])
+            assert result["scores"][name][i] == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    assert np.all(result["scores"]["nse"][result["behavioural"]] >= 0.5)
+    assert len(result["behavioural"]) == np.sum(result["scores"]["nse"] >= 0.5)
+
+
+def test_parallel_evaluator():
+    rng = np.random.default_rng(42)
+    arr = rng.random(1000)
+    obs = transep.simulate(arr, transep.gamma_function, 1, alpha=2.5, beta=10)
+    params = calibrate.sample_parameters(dict(alpha=(1, 5), beta=(1, 50)), 300, seed=42)
+    expected = calibrate.evaluate(arr, obs, transep.gamma_function, params, batch_size=32)
+    with parallel.ParallelEvaluator(arr, obs, n_workers=2) as evaluator:
+        output = evaluator.evaluate(transep.gamma_function, params, batch_size=32)
+    for name in calibrate.OBJECTIVES:
+        assert output[name] == pytest.approx(expected[name], rel=1e-12)
+
+
+def test_objective_reducer():
+    rng = np.random.default_rng(42)
+    arr = rng.random(3000)
+    obs = transep.simulate(arr, transep.dispersion_function, 1, p_d=0.2, mtt=60) + 10
+    obs[rng.random(3000) < 0.5] = np.nan
+    mask = np.isfinite(obs)
+    params = dict(p_d=np.array([0.1, 0.2, 0.3]), mtt=np.array([40, 60, 80]))
+    reducer = calibrate.ObjectiveReducer((3,))
+    chunks = np.array_split(arr, 7)
+    start = 0
+    for sim in transep.simulate_stream(chunks, transep.dispersion_function, 1, 3000, **params):
+        reducer.update(sim + 10, obs[start:start + sim.shape[-1]])
+        start += sim.shape[-1]
+    sim = transep.simulate_batch(arr, transep.dispersion_function, 1, params) + 10
+    for name, value in reducer.scores().items():
+        assert value == pytest.approx(getattr(calibrate, name)(sim[:, mask], obs[mask]), rel=1e-9)
+
+    expected = calibrate.evaluate(arr, obs, transep.dispersion_function, params)
+    output = calibrate.evaluate(arr, obs, transep.dispersion_function, params, chunk_length=256)
+    for name in calibrate.OBJECTIVES:
+        assert output[name] == pytest.approx(expected[name], rel=1e-9)
+
+
+@pytest.mark.parametrize("objective, threshold", [("nse", 0.8), ("rmse", 0.02)])
+def test_early_abort(objective, threshold):
+    rng = np.random.default_rng(42)
+    arr = rng.random(5000)
+    obs = transep.simulate(arr, transep.gamma_function, 1, alpha=2.5, beta=10) + rng.normal(0, 0.01, 5000)
+    params = calibrate.sample_parameters(dict(alpha=(1, 5), beta=(1, 20)), 300, seed=42)
+    expected = calibrate.evaluate(arr, obs, transep.gamma_function, params, batch_size=64, tol=1e-8)
+    output, info = calibrate.evaluate(arr, obs, transep.gamma_function, params, batch_size=64, tol=1e-8,
+                                      chunk_length=500, objective=objective, threshold=threshold, full_output=True)
+    behavioural = calibrate.behavioural(expected, objective, threshold)
+    assert len(behavioural) > 0
+    assert np.array_equal(calibrate.behavioural(output, objective, threshold), behavioural)
+    assert np.array_equal(np.flatnonzero(~info["aborted"]), behavioural)
+    assert output["nse"][behavioural] == pytest.approx(expected["nse"][behavioural], rel=1e-9)
+    assert 0 < info["work_saved"] < 1
+
+    # the transfer functions are truncated by default
+    output, info = calibrate.evaluate(arr, obs, transep.gamma_function, params, batch_size=64,
+                                      objective=objective, threshold=threshold, full_output=True)
+    assert np.array_equal(calibrate.behavioural(output, objective, threshold), behavioural)
+    assert 0 < info["work_saved"] < 1
+    assert info["fft_work"] < info["total_fft_work"]
+
+
+@pytest.mark.parametrize("g, params", [
+    (transep.dispersion_function, dict(p_d=0.2, mtt=60)),
+    (transep.linear_reservoir_function, dict(mtt=40)),
+    (transep.parallel_linear_reservoir_function, dict(mtt_slow=60, mtt_fast=10, frac_fast=0.3)),
+    (transep.exponential_piston_function, dict(mtt=40, eta=1.5)),
+    (transep.gamma_function, dict(alpha=2.5, beta=10)),
+])
+def test_simulate_with_jacobian(g, params):
+    arr = np.random.default_rng(42).random(1000)
+    output, jacobian = transep.simulate_with_jacobian(arr, g, 2, **params)
+    assert output == pytest.approx(transep.simulate(arr, g, 2, engine="convolution", **params), abs=1e-12)
+    assert list(jacobian) == list(params)
+    for name, value in params.items():
+        step = 1e-6 * value
+        upper = transep.simulate(arr, g, 2, engine="convolution", **{**params, name: value + step})
+        lower = transep.simulate(arr, g, 2, engine="convolution", **{**params, name: value - step})
+        assert jacobian[name] == pytest.approx((upper - lower) / (2 * step), rel=1e-5, abs=1e-8)
+
+
+def test_minimize():
+    arr = np.random.default_rng(42).gamma(0.5, 2, 5000)
+    obs = transep.simulate(arr, transep.gamma_function, 1, alpha=2.5, beta=20)
+    obs[::3] = np.nan
+    result = calibrate.minimize(arr, obs, transep.gamma_function, dict(alpha=(1, 5), beta=(5, 50)))
+    assert result["success"]
+    assert result["params"]["alpha"] == pytest.approx(2.5, rel=1e-4)
+    assert result["params"]["beta"] == pytest.approx(20, rel=1e-4)
+    assert result["scores"]["nse"] == pytest.approx(1)
+    assert result["evaluations"] < 50
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+_cache = None
+
+
+class KernelCache:
+    """Least-recently-used cache of sampled transfer functions
+
+    The cached transfer functions are read-only, so a cache hit returns the
+    cached array without copying it. If the total size of the cached arrays
+    exceeds `max_bytes`, the least recently used entries are evicted.
+
+    Args
+    ----
+    max_bytes : int, optional
+        maximum total size of cached arrays in bytes
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached value of a key or None if the key is not cached
+
+        Args
+        ----
+        key : tuple
+            hashable key
+
+        Returns
+        -------
+        value : tuple
+            sampled transfer function and dropped mass
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+    def put(self, key, gout, dropped_mass):
+        """Caches a sampled transfer function
+
+        Args
+        ----
+        key : tuple
+            hashable key
+
+        gout : np.array
+            sampled transfer function. The array is made read-only.
+
+        dropped_mass : float
+            mass of the dropped tail of the transfer function
+        """
+        if gout.nbytes > self.max_bytes:
+            return
+        gout.flags.writeable = False
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[0].nbytes
+        self._entries[key] = (gout, dropped_mass)
+        self.nbytes += gout.nbytes
+        while self.nbytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self):
+        """Returns the statistics of the cache
+
+        Returns
+        -------
+        info : dict
+            number of hits, misses and evictions, number of entries and
+            total size of cached arrays in bytes
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def enable_cache(max_bytes=256 * 2**20):
+    """Enables caching of sampled transfer functions
+
+    Transfer functions are cached by function, parameters, number of time
+    steps and truncation tolerance. Since the sampled transfer function
+    does not depend on the incremental time step, simulations with
+    different time steps share the cache entries.
+
+    Args
+    ----
+    max_bytes : int, optional
+        maximum total size of cached arrays in bytes
+
+    Returns
+    -------
+    cache : KernelCache
+        enabled cache
+    """
+    global _cache
+    _cache = KernelCache(max_bytes=max_bytes)
+
+    return _cache
+
+
+def disable_cache():
+    """Disables caching of sampled transfer functions"""
+    global _cache
+    _cache = None
+
+
+def get_cache():
+    """Returns the enabled cache or None if caching is disabled
+
+    Returns
+    -------
+    cache : KernelCache
+        enabled cache
+    """
+    return _cache
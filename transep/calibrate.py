@@ -0,0 +1,675 @@
+import time
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import optimize
+
+from transep import convolution, parallel, transep
+
+OBJECTIVES = ("nse", "kge", "rmse")
+# objective functions which are maximized (otherwise minimized)
+MAXIMIZED = ("nse", "kge")
+# maximum mass of the dropped tail of the transfer functions if parameter
+# sets are dropped early and no tolerance is given (see evaluate)
+EARLY_ABORT_TOL = 1e-6
+
+
+def nse(sim, obs):
+    r"""Nash-Sutcliffe efficiency
+
+    .. math::
+
+        NSE = 1 - \frac{\sum_{t} (s_{t} - o_{t})^2}{\sum_{t} (o_{t} - \bar{o})^2}
+
+    Args
+    ----
+    sim : np.array
+        simulated values of shape (n_obs,) or (n_params, n_obs)
+
+    obs : np.array
+        observed values of shape (n_obs,)
+
+    Returns
+    -------
+    nse : float, np.array
+        Nash-Sutcliffe efficiency of each simulation
+    """
+    obs = np.asarray(obs, dtype=float)
+    sse = np.sum((sim - obs)**2, axis=-1)
+
+    return 1 - sse / np.sum((obs - np.mean(obs))**2)
+
+
+def kge(sim, obs):
+    r"""Kling-Gupta efficiency
+
+    .. math::
+
+        KGE = 1 - \sqrt{(r - 1)^2 + (\alpha - 1)^2 + (\beta - 1)^2}
+
+    with the linear correlation :math:`r`, the ratio of the standard
+    deviations :math:`\alpha = \sigma_{s} / \sigma_{o}` and the ratio of the
+    means :math:`\beta = \mu_{s} / \mu_{o}` of simulated and observed values.
+
+    Args
+    ----
+    sim : np.array
+        simulated values of shape (n_obs,) or (n_params, n_obs)
+
+    obs : np.array
+        observed values of shape (n_obs,)
+
+    Returns
+    -------
+    kge : float, np.array
+        Kling-Gupta efficiency of each simulation
+    """
+    obs = np.asarray(obs, dtype=float)
+    sim_anomaly = sim - np.mean(sim, axis=-1, keepdims=True)
+    obs_anomaly = obs - np.mean(obs)
+    sim_std = np.sqrt(np.mean(sim_anomaly**2, axis=-1))
+    obs_std = np.sqrt(np.mean(obs_anomaly**2))
+    r = np.mean(sim_anomaly * obs_anomaly, axis=-1) / (sim_std * obs_std)
+    alpha = sim_std / obs_std
+    beta = np.mean(sim, axis=-1) / np.mean(obs)
+
+    return 1 - np.sqrt((r - 1)**2 + (alpha - 1)**2 + (beta - 1)**2)
+
+
+def rmse(sim, obs):
+    r"""Root mean square error
+
+    .. math::
+
+        RMSE = \sqrt{\frac{1}{n} \sum_{t} (s_{t} - o_{t})^2}
+
+    Args
+    ----
+    sim : np.array
+        simulated values of shape (n_obs,) or (n_params, n_obs)
+
+    obs : np.array
+        observed values of shape (n_obs,)
+
+    Returns
+    -------
+    rmse : float, np.array
+        root mean square error of each simulation
+    """
+    return np.sqrt(np.mean((sim - np.asarray(obs, dtype=float))**2, axis=-1))
+
+
+class ObjectiveReducer:
+    """Accumulates the objective functions chunk by chunk
+
+    The number of observations and the sums of the simulated and observed
+    values, of their squares and products and of the squared errors are
+    accumulated from chunks of simulated and observed values, e.g. from
+    :func:`transep.transep.simulate_stream`. The objective functions are
+    calculated from these sums, so the simulated output signal is never
+    held in memory. The values are shifted by the mean of the first
+    observations to avoid cancellation in the sums of squares.
+
+    Args
+    ----
+    shape : tuple, optional
+        shape of the objective functions, e.g. (n_params,) for the output
+        signals of many parameter sets
+    """
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.shift = None
+        self.sum_sim = np.zeros(shape)
+        self.sum_obs = 0.0
+        self.sum_sim2 = np.zeros(shape)
+        self.sum_obs2 = 0.0
+        self.sum_sim_obs = np.zeros(shape)
+        self.sum_sq_err = np.zeros(shape)
+
+    def update(self, sim, obs, index=None):
+        """Accumulates a chunk of simulated and observed values
+
+        Args
+        ----
+        sim : np.array
+            chunk of simulated values of shape (n_steps,) or (n_params, n_steps)
+
+        obs : np.array
+            chunk of observed values of shape (n_steps,). Missing
+            observations are NaN.
+
+        index : np.array, optional
+            indices of the parameter sets of the simulated values. By
+            default, the simulated values of all parameter sets are passed.
+        """
+        obs = np.asarray(obs, dtype=float)
+        mask = np.isfinite(obs)
+        if not np.any(mask):
+            return
+        sim, obs = np.asarray(sim, dtype=float)[..., mask], obs[mask]
+        if self.shift is None:
+            self.shift = np.mean(obs)
+        x, y = sim - self.shift, obs - self.shift
+        self.count += len(y)
+        self.sum_obs += np.sum(y)
+        self.sum_obs2 += np.sum(y**2)
+        if index is None:
+            self.sum_sim = self.sum_sim + np.sum(x, axis=-1)
+            self.sum_sim2 = self.sum_sim2 + np.sum(x**2, axis=-1)
+            self.sum_sim_obs = self.sum_sim_obs + x @ y
+            self.sum_sq_err = self.sum_sq_err + np.sum((x - y)**2, axis=-1)
+        else:
+            self.sum_sim[index] += np.sum(x, axis=-1)
+            self.sum_sim2[index] += np.sum(x**2, axis=-1)
+            self.sum_sim_obs[index] += x @ y
+            self.sum_sq_err[index] += np.sum((x - y)**2, axis=-1)
+
+    def _moments(self):
+        mean_sim, mean_obs = self.sum_sim / self.count, self.sum_obs / self.count
+        var_sim = self.sum_sim2 / self.count - mean_sim**2
+        var_obs = self.sum_obs2 / self.count - mean_obs**2
+        cov = self.sum_sim_obs / self.count - mean_sim * mean_obs
+
+        return mean_sim + self.shift, mean_obs + self.shift, var_sim, var_obs, cov
+
+    def nse(self):
+        """Nash-Sutcliffe efficiency (see :func:`nse`)"""
+        _, _, _, var_obs, _ = self._moments()
+
+        return 1 - self.sum_sq_err / (var_obs * self.count)
+
+    def kge(self):
+        """Kling-Gupta efficiency (see :func:`kge`)"""
+        mean_sim, mean_obs, var_sim, var_obs, cov = self._moments()
+        std_sim, std_obs = np.sqrt(np.maximum(var_sim, 0)), np.sqrt(var_obs)
+        r = cov / (std_sim * std_obs)
+
+        return 1 - np.sqrt((r - 1)**2 + (std_sim / std_obs - 1)**2 + (mean_sim / mean_obs - 1)**2)
+
+    def rmse(self):
+        """Root mean square error (see :func:`rmse`)"""
+        return np.sqrt(self.sum_sq_err / self.count)
+
+    def scores(self):
+        """Returns the objective functions
+
+        Returns
+        -------
+        scores : dict
+            values of the objective functions (`nse`, `kge` and `rmse`)
+        """
+        return {name: getattr(self, name)() for name in OBJECTIVES}
+
+
+def sample_parameters(bounds, n, seed=None):
+    """Samples parameters from uniform distributions
+
+    Args
+    ----
+    bounds : dict
+        lower and upper bound of each parameter
+
+    n : int
+        number of parameter sets
+
+    seed : int, optional
+        seed of random number generator
+
+    Returns
+    -------
+    params : dict
+        sampled values of each parameter
+    """
+    rng = np.random.default_rng(seed)
+
+    return {name: rng.uniform(low, high, n) for name, (low, high) in bounds.items()}
+
+
+def behavioural(scores, objective, threshold):
+    """Selects the behavioural parameter sets
+
+    Args
+    ----
+    scores : dict
+        values of the objective functions (see :func:`monte_carlo`)
+
+    objective : str
+        objective function (`nse`, `kge` or `rmse`)
+
+    threshold : float
+        minimum value of NSE and KGE or maximum value of RMSE
+
+    Returns
+    -------
+    index : np.array
+        indices of the behavioural parameter sets
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective function '{objective}'. Choose from {OBJECTIVES}.")
+    if objective in MAXIMIZED:
+        return np.flatnonzero(scores[objective] >= threshold)
+
+    return np.flatnonzero(scores[objective] <= threshold)
+
+
+def monte_carlo(input, obs, g, bounds, n=100_000, dtau=1, objective="nse", threshold=None, batch_size=1024,
+                tol=None, seed=None, n_workers=None, chunk_length=None, early_abort=False, **kwargs):
+    """Monte Carlo (GLUE) calibration of a transport model
+
+    The parameters are sampled from uniform distributions and the transfer
+    functions are evaluated in batches of parameter sets. The spectrum of
+    the input signal is calculated once and multiplied with the spectra of
+    the transfer functions of each batch. The simulated values of a batch
+    are reduced to the objective functions at the observed time steps, so
+    the output signals of all parameter sets are never held in memory.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    obs : np.array
+        observed output signal with the same length as the input signal.
+        Missing observations are NaN.
+
+    g : function
+        transfer function which broadcasts array-valued parameters like the
+        built-in transfer functions
+
+    bounds : dict
+        lower and upper bound of each calibrated parameter
+
+    n : int, optional
+        number of parameter sets
+
+    dtau : int, float, optional
+        incremental time step
+
+    objective : str, optional
+        objective function which selects the behavioural parameter sets
+        (`nse`, `kge` or `rmse`)
+
+    threshold : float, optional
+        minimum value of NSE and KGE or maximum value of RMSE of the
+        behavioural parameter sets. By default, no parameter sets are
+        selected.
+
+    batch_size : int, optional
+        number of parameter sets which are evaluated at once
+
+    tol : float, optional
+        maximum mass of the tail of the transfer functions which is dropped
+        (see :func:`transep.transep.truncate_kernel`)
+
+    seed : int, optional
+        seed of random number generator
+
+    n_workers : int, optional
+        number of worker processes (see
+        :class:`transep.parallel.ParallelEvaluator`). By default, the
+        parameter sets are evaluated in the calling process.
+
+    chunk_length : int, optional
+        number of time steps which are simulated at once (see
+        :func:`evaluate`). By default, the whole record is simulated at
+        once.
+
+    early_abort : bool, optional
+        if True, parameter sets are dropped as soon as their sum of squared
+        errors shows that they are not behavioural (see :func:`evaluate`).
+        Requires `threshold` and the objective function `nse` or `rmse`.
+
+    **kwargs
+        fixed parameters of transfer function
+
+    Returns
+    -------
+    result : dict
+        sampled parameters (`params`), values of the objective functions
+        (`scores`), indices of the behavioural parameter sets
+        (`behavioural`), elapsed time in seconds (`elapsed`), number of
+        evaluated parameter sets per second (`throughput`) and fraction of
+        the FFT work which has been saved by early abort (`work_saved`, see
+        :func:`evaluate`)
+    """
+    if early_abort and threshold is None:
+        raise ValueError("Early abort requires a threshold.")
+    start_time = time.perf_counter()
+    params = sample_parameters(bounds, n, seed=seed)
+    options = dict(dtau=dtau, batch_size=batch_size, tol=tol, chunk_length=chunk_length, objective=objective,
+                   threshold=threshold if early_abort else None, full_output=True)
+    if n_workers is None:
+        scores, info = evaluate(input, obs, g, params, **options, **kwargs)
+    else:
+        with parallel.ParallelEvaluator(input, obs, n_workers=n_workers) as evaluator:
+            scores, info = evaluator.evaluate(g, params, **options, **kwargs)
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "params": params,
+        "scores": scores,
+        "behavioural": None if threshold is None else behavioural(scores, objective, threshold),
+        "elapsed": elapsed,
+        "throughput": n / elapsed if elapsed > 0 else np.inf,
+        "work_saved": info["work_saved"],
+    }
+
+
+def minimize(input, obs, g, bounds, x0=None, dtau=1, tol=None, maxiter=100, **kwargs):
+    """Gradient-based calibration of a transport model
+
+    The sum of squared errors at the observed time steps, i.e. the
+    Nash-Sutcliffe efficiency, is optimized by L-BFGS-B within the bounds of
+    the parameters. The gradient is calculated from the sensitivities of the
+    output signal (see :func:`transep.transep.simulate_with_jacobian`), so
+    each iteration requires a single simulation. The parameters are scaled
+    to the unit interval by their bounds.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    obs : np.array
+        observed output signal with the same length as the input signal.
+        Missing observations are NaN.
+
+    g : function
+        built-in transfer function
+
+    bounds : dict
+        lower and upper bound of each calibrated parameter
+
+    x0 : dict, optional
+        initial value of each calibrated parameter. By default, the centre
+        of the bounds.
+
+    dtau : int, float, optional
+        incremental time step
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`transep.transep.truncate_kernel`)
+
+    maxiter : int, optional
+        maximum number of iterations
+
+    **kwargs
+        fixed parameters of transfer function
+
+    Returns
+    -------
+    result : dict
+        calibrated parameters (`params`), values of the objective functions
+        (`scores`), number of simulations (`evaluations`), whether the
+        optimizer has converged (`success`) and its message (`message`)
+    """
+    obs = np.asarray(obs, dtype=float)
+    observed = np.isfinite(obs)
+    names = list(bounds)
+    lower = np.array([bounds[name][0] for name in names], dtype=float)
+    scale = np.array([bounds[name][1] for name in names], dtype=float) - lower
+    if x0 is None:
+        start = np.full(len(names), 0.5)
+    else:
+        start = (np.array([x0[name] for name in names], dtype=float) - lower) / scale
+
+    def fun(x):
+        params = dict(zip(names, lower + x * scale))
+        sim, jacobian = transep.simulate_with_jacobian(input, g, dtau, tol=tol, **params, **kwargs)
+        errors = sim[observed] - obs[observed]
+        gradient = np.array([2 * np.dot(errors, jacobian[name][observed]) for name in names])
+        return np.dot(errors, errors), gradient * scale
+
+    result = optimize.minimize(fun, start, jac=True, method="L-BFGS-B", bounds=[(0, 1)] * len(names),
+                               options=dict(maxiter=maxiter))
+    params = dict(zip(names, lower + result.x * scale))
+    sim = transep.simulate(input, g, dtau, tol=tol, **params, **kwargs)[observed]
+    obs = obs[observed]
+
+    return {
+        "params": params,
+        "scores": {"nse": nse(sim, obs), "kge": kge(sim, obs), "rmse": rmse(sim, obs)},
+        "evaluations": result.nfev,
+        "success": result.success,
+        "message": result.message,
+    }
+
+
+def max_sum_squared_errors(obs, objective, threshold):
+    """Maximum sum of squared errors of a behavioural parameter set
+
+    Args
+    ----
+    obs : np.array
+        observed values. Missing observations are NaN.
+
+    objective : str
+        objective function (`nse` or `rmse`). The Kling-Gupta efficiency is
+        not bounded by the sum of squared errors.
+
+    threshold : float
+        minimum value of NSE or maximum value of RMSE
+
+    Returns
+    -------
+    sse : float
+        maximum sum of squared errors
+    """
+    obs = np.asarray(obs, dtype=float)
+    obs = obs[np.isfinite(obs)]
+    if objective == "nse":
+        return (1 - threshold) * np.sum((obs - np.mean(obs))**2)
+    elif objective == "rmse":
+        return threshold**2 * len(obs)
+
+    raise ValueError(f"Objective function '{objective}' is not bounded by the sum of squared errors.")
+
+
+def evaluate(input, obs, g, params, dtau=1, batch_size=1024, tol=None, chunk_length=None, objective="nse",
+             threshold=None, full_output=False, **kwargs):
+    """Evaluates the objective functions of many parameter sets
+
+    The objective functions are accumulated by :class:`ObjectiveReducer`.
+    By default, the output signals of a batch of parameter sets are
+    calculated at once. If `chunk_length` is given, the output signals are
+    calculated chunk by chunk by overlap-save, so the memory usage is
+    bounded by the batch size times the chunk length plus the length of the
+    transfer functions.
+
+    If `threshold` is given, the parameter sets are evaluated chunk by chunk
+    and a parameter set is dropped as soon as its sum of squared errors
+    exceeds the maximum of a behavioural parameter set (see
+    :func:`max_sum_squared_errors`). The remaining chunks are only
+    calculated for the parameter sets which have not been dropped, and
+    chunks without observations are skipped. The objective functions of
+    dropped parameter sets are NaN. Since each chunk is convolved with the
+    preceding input values over the length of the transfer functions, the
+    transfer functions are truncated at :data:`EARLY_ABORT_TOL` if `tol` is
+    not given. Early abort saves work if the truncated transfer functions
+    are short compared to the record.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    obs : np.array
+        observed output signal with the same length as the input signal.
+        Missing observations are NaN.
+
+    g : function
+        transfer function which broadcasts array-valued parameters like the
+        built-in transfer functions
+
+    params : dict
+        values of each calibrated parameter
+
+    dtau : int, float, optional
+        incremental time step
+
+    batch_size : int, optional
+        number of parameter sets which are evaluated at once
+
+    tol : float, optional
+        maximum mass of the tail of the transfer functions which is dropped
+        (see :func:`transep.transep.truncate_kernel`). If `threshold` is
+        given, :data:`EARLY_ABORT_TOL` by default.
+
+    chunk_length : int, optional
+        number of time steps which are simulated at once. If `threshold` is
+        given, the record is split into 16 chunks by default, but the chunks
+        are not shorter than four times the length of the transfer
+        functions.
+
+    objective : str, optional
+        objective function which is bounded by `threshold` (`nse` or `rmse`)
+
+    threshold : float, optional
+        minimum value of NSE or maximum value of RMSE of the behavioural
+        parameter sets. By default, all parameter sets are evaluated for
+        the whole record.
+
+    full_output : bool, optional
+        if True, information on the evaluation is returned as well
+
+    **kwargs
+        fixed parameters of transfer function
+
+    Returns
+    -------
+    scores : dict
+        values of the objective functions (`nse`, `kge` and `rmse`) of each
+        parameter set
+
+    info : dict
+        dropped parameter sets (`aborted`), number of simulated time steps
+        of all parameter sets (`simulated_steps`) and of a full evaluation
+        (`total_steps`), FFT work of the evaluation (`fft_work`) and of a
+        full evaluation without chunks (`total_fft_work`) measured as
+        nfft * log2(nfft) per transform and fraction of the FFT work which has been saved
+        (`work_saved`). The saved work is negative if the chunks are
+        shorter than the transfer functions. Only returned if `full_output`
+        is True.
+    """
+    input = np.asarray(input, dtype=float)
+    obs = np.asarray(obs, dtype=float)
+    n = input.shape[-1]
+    if obs.shape != (n,):
+        raise ValueError("Observations must have the same length as the input signal.")
+    mask = np.isfinite(obs)
+    n_params = len(next(iter(params.values()))) if params else 0
+    scores = {name: np.zeros(n_params) for name in OBJECTIVES}
+    sse_max = None
+    if threshold is not None:
+        sse_max = max_sum_squared_errors(obs, objective, threshold)
+        if tol is None:
+            tol = EARLY_ABORT_TOL
+    aborted = np.zeros(n_params, dtype=bool)
+    simulated_steps = 0
+    fft_work, total_fft_work = 0.0, 0.0
+    # spectrum of input signal for each FFT length
+    spectra = {}
+    for start in range(0, n_params, batch_size):
+        batch = {name: np.asarray(value[start:start + batch_size]) for name, value in params.items()}
+        gout, _ = transep.truncate_kernel(g, n, tol=tol, **batch, **kwargs)
+        reducer = ObjectiveReducer(gout.shape[:-1])
+        n_rows = int(np.prod(gout.shape[:-1]))
+        # transform of the transfer functions and inverse transform of the
+        # output signals of a full evaluation
+        full_work = _fft_work(2 * n_rows + 1, convolution.next_fast_len(n + min(gout.shape[-1], n) - 1))
+        total_fft_work += full_work
+        if sse_max is not None:
+            length = chunk_length
+            if length is None:
+                # overlap-save is efficient for chunks longer than the kernel
+                length = max(-(-n // 16), 4 * gout.shape[-1])
+            active, simulated, work = _bounded_update(reducer, input, obs, gout * dtau, length, sse_max)
+            simulated_steps += simulated
+            fft_work += work
+            dropped = np.ones(gout.shape[:-1], dtype=bool)
+            dropped[active] = False
+            aborted[start:start + batch_size] = dropped
+        elif chunk_length is not None:
+            chunks = [input[i:i + chunk_length] for i in range(0, n, chunk_length)]
+            for i, sim in enumerate(convolution.overlap_save(chunks, gout * dtau)):
+                reducer.update(sim, obs[i * chunk_length:(i + 1) * chunk_length])
+        else:
+            n_kernel = gout.shape[-1]
+            if n_kernel not in spectra:
+                if len(spectra) >= 4:
+                    spectra.clear()
+                spectra[n_kernel] = convolution.rfft_input(input, n_kernel)
+            spectrum, nfft = spectra[n_kernel]
+            sim = convolution.convolve_spectrum(spectrum, gout, n, nfft)[..., mask] * dtau
+            reducer.update(sim, obs[mask])
+        if sse_max is None:
+            simulated_steps += n * n_rows
+            fft_work += full_work
+        for name, value in reducer.scores().items():
+            scores[name][start:start + batch_size] = value
+
+    for name in OBJECTIVES:
+        scores[name][aborted] = np.nan
+
+    if full_output:
+        total_steps = n * n_params
+        info = {
+            "aborted": aborted,
+            "simulated_steps": simulated_steps,
+            "total_steps": total_steps,
+            "fft_work": fft_work,
+            "total_fft_work": total_fft_work,
+            "work_saved": 1 - fft_work / total_fft_work if total_fft_work > 0 else 0.0,
+        }
+        return scores, info
+
+    return scores
+
+
+def _bounded_update(reducer, input, obs, kernel, chunk_length, sse_max):
+    """Accumulates the objective functions chunk by chunk and drops the
+    parameter sets whose sum of squared errors exceeds `sse_max`
+
+    Returns the indices of the remaining parameter sets, the number of
+    simulated time steps and the FFT work of all parameter sets.
+    """
+    n = input.shape[-1]
+    kernel = np.atleast_2d(kernel)
+    m = kernel.shape[-1]
+    active = np.arange(kernel.shape[0])
+    simulated = 0
+    work = 0.0
+    # spectra of kernels for each FFT length
+    spectra = {}
+    for start in range(0, n, chunk_length):
+        stop = min(start + chunk_length, n)
+        if active.size == 0:
+            break
+        if not np.any(np.isfinite(obs[start:stop])):
+            # the output is only required at observed time steps
+            continue
+        # input values which contribute to the output of the chunk
+        first = max(start - m + 1, 0)
+        segment = input[first:stop]
+        nfft = convolution.next_fast_len(len(segment) + m - 1)
+        if nfft not in spectra:
+            if len(spectra) >= 4:
+                spectra.clear()
+            spectra[nfft] = sp_fft.rfft(kernel, nfft, axis=-1)
+            work += _fft_work(kernel.shape[0], nfft)
+        kernel_spectra = spectra[nfft] if active.size == kernel.shape[0] else spectra[nfft][active]
+        spec = sp_fft.rfft(segment, nfft) * kernel_spectra
+        sim = sp_fft.irfft(spec, nfft, axis=-1)[:, start - first:stop - first]
+        reducer.update(sim, obs[start:stop], index=active)
+        simulated += active.size * (stop - start)
+        work += _fft_work(active.size + 1, nfft)
+        active = active[reducer.sum_sq_err[active] <= sse_max]
+
+    return active, simulated, work
+
+
+def _fft_work(n_rows, nfft):
+    """FFT work n_rows * nfft * log2(nfft) of `n_rows` transforms of length
+    `nfft`"""
+    return n_rows * nfft * np.log2(max(nfft, 2))
@@ -0,0 +1,256 @@
+import numpy as np
+
+from transep import convolution, transep
+
+
+class Composite:
+    """Base class of composite transfer functions
+
+    A composite transfer function is called like the built-in transfer
+    functions, i.e. `g(tau)` returns the transfer function sampled at
+    `tau`, and is passed to :func:`transep.transep.simulate` without
+    parameters. The default engine (`composite`) evaluates each part by the
+    fastest engine which is available for it.
+
+    Args
+    ----
+    parts : list
+        transfer functions. Each part is a transfer function with default
+        parameters, a tuple of a transfer function and a dictionary of its
+        parameters or a composite transfer function.
+    """
+
+    def __init__(self, parts):
+        if len(parts) == 0:
+            raise ValueError("Composite transfer function requires at least one part.")
+        self.parts = [_part(part) for part in parts]
+        self.__name__ = type(self).__name__
+
+    def _key(self):
+        return tuple((g, tuple(sorted(params.items()))) for g, params in self.parts)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash((type(self), self._key()))
+
+    def engine(self):
+        """Returns the engine which is used by :func:`transep.transep.simulate`
+        if the engine is `auto`"""
+        if any(_is_fast(g, params) for g, params in self.parts):
+            return "composite"
+
+        return "convolution"
+
+    def survival_function(self):
+        """Returns analytic survival function, otherwise None"""
+        return None
+
+    def spectrum_function(self):
+        """Returns analytic spectrum of sampled transfer function, otherwise None"""
+        return None
+
+
+class Mixture(Composite):
+    r"""Weighted sum of transfer functions
+
+    .. math::
+
+        g(\tau) = \sum_{i} w_{i} g_{i}(\tau)
+
+    e.g. parallel flow paths with a dispersive and a gamma-distributed
+    travel time. The linear reservoir, gamma (integer shape parameter) and
+    exponential-piston parts are evaluated recursively and the remaining
+    parts are summed to a single transfer function, which is evaluated by
+    a single convolution.
+
+    Args
+    ----
+    parts : list
+        transfer functions (see :class:`Composite`)
+
+    weights : array_like, optional
+        weight of each part. By default, the parts are weighted equally.
+    """
+
+    def __init__(self, parts, weights=None):
+        super().__init__(parts)
+        if weights is None:
+            weights = np.full(len(self.parts), 1 / len(self.parts))
+        self.weights = np.asarray(weights, dtype=float)
+        if self.weights.shape != (len(self.parts),):
+            raise ValueError("Number of weights must match the number of parts.")
+
+    def _key(self):
+        return super()._key() + (tuple(self.weights),)
+
+    def __call__(self, tau):
+        return sum(w * g(tau, **params) for w, (g, params) in zip(self.weights, self.parts))
+
+    def survival_function(self):
+        survivals = [transep._survival_function(g, **params) for g, params in self.parts]
+        if any(survival is None for survival in survivals):
+            return None
+
+        def survival(tau):
+            return sum(w * s(tau) for w, s in zip(self.weights, survivals))
+
+        return survival
+
+    def spectrum_function(self):
+        spectra = [transep._spectrum_function(g, **params) for g, params in self.parts]
+        if any(spectrum is None for spectrum in spectra):
+            return None
+
+        def spectrum(omega):
+            return sum(w * s(omega, **params) for w, s, (_, params) in zip(self.weights, spectra, self.parts))
+
+        return spectrum
+
+    def integral(self, input, dtau, method="auto", tol=None):
+        """Calculates convolution integral
+
+        Args
+        ----
+        input : np.array
+            input signal
+
+        dtau : int, float
+            incremental time step
+
+        method : str, optional
+            convolution method of the parts which cannot be evaluated
+            recursively
+
+        tol : float, optional
+            maximum mass of the tail of the transfer function which is
+            dropped by the convolution (see
+            :func:`transep.transep.truncate_kernel`)
+
+        Returns
+        -------
+        fout : np.array
+            output signal
+        """
+        input = np.asarray(input, dtype=float)
+        out = np.zeros(input.shape)
+        slow, weights = [], []
+        for w, (g, params) in zip(self.weights, self.parts):
+            if _is_fast(g, params):
+                out += w * transep.simulate(input, g, 1, **params)
+            else:
+                slow.append((g, params))
+                weights.append(w)
+        if len(slow) == 1:
+            g, params = slow[0]
+            out += weights[0] * transep.convolution_integral(input, g, 1, method=method, tol=tol, **params)
+        elif slow:
+            rest = Mixture(slow, weights)
+            out += transep.convolution_integral(input, rest, 1, method=method, tol=tol)
+
+        return out * dtau
+
+
+class Series(Composite):
+    r"""Transfer functions in series
+
+    The input signal is routed through the parts one after another, i.e.
+    the sampled transfer function is the discrete convolution of the sampled
+    parts
+
+    .. math::
+
+        h = h_{1} * h_{2} * \ldots
+
+    e.g. a piston flow delay followed by a gamma-distributed travel time.
+    The order of the parts does not alter the result. The linear reservoir,
+    gamma (integer shape parameter) and exponential-piston parts are
+    evaluated by chained recursive filters. The remaining parts are
+    evaluated by a single convolution with the convolved transfer
+    functions.
+
+    Args
+    ----
+    parts : list
+        transfer functions (see :class:`Composite`)
+    """
+
+    def __call__(self, tau):
+        tau = np.asarray(tau, dtype=float)
+        n = int(np.max(tau)) if tau.size > 0 else 0
+        t = np.arange(1, n + 1, dtype=float)
+        g, params = self.parts[0]
+        gout = g(t, **params)
+        for g, params in self.parts[1:]:
+            gout = convolution.convolve(gout, g(t, **params))
+
+        # transfer function is defined at integer time steps only
+        return gout[..., np.round(tau).astype(int) - 1]
+
+    def spectrum_function(self):
+        spectra = [transep._spectrum_function(g, **params) for g, params in self.parts]
+        if any(spectrum is None for spectrum in spectra):
+            return None
+
+        def spectrum(omega):
+            out = 1
+            for s, (_, params) in zip(spectra, self.parts):
+                out = out * s(omega, **params)
+            return out
+
+        return spectrum
+
+    def integral(self, input, dtau, method="auto", tol=None):
+        """Calculates convolution integral
+
+        Args
+        ----
+        input : np.array
+            input signal
+
+        dtau : int, float
+            incremental time step
+
+        method : str, optional
+            convolution method of the parts which cannot be evaluated
+            recursively
+
+        tol : float, optional
+            maximum mass of the tail of the transfer function which is
+            dropped by the convolution (see
+            :func:`transep.transep.truncate_kernel`)
+
+        Returns
+        -------
+        fout : np.array
+            output signal
+        """
+        out = np.asarray(input, dtype=float)
+        slow = []
+        for g, params in self.parts:
+            if _is_fast(g, params):
+                out = transep.simulate(out, g, 1, **params)
+            else:
+                slow.append((g, params))
+        if len(slow) == 1:
+            g, params = slow[0]
+            out = transep.convolution_integral(out, g, 1, method=method, tol=tol, **params)
+        elif slow:
+            out = transep.convolution_integral(out, Series(slow), 1, method=method, tol=tol)
+
+        return out * dtau
+
+
+def _part(part):
+    """Returns transfer function and its parameters"""
+    if isinstance(part, tuple):
+        g, params = part
+        return g, dict(params)
+
+    return part, {}
+
+
+def _is_fast(g, params):
+    """Checks whether transfer function is evaluated without convolution"""
+    return transep._select_engine(g, **params) != "convolution"
@@ -0,0 +1,575 @@
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import signal
+
+METHODS = ("direct", "fft", "overlap-add", "sparse", "auto")
+
+# relative cost of one butterfly (N log2 N unit) of a real FFT compared
+# to one multiply-add of the direct convolution
+_FFT_WEIGHT = 5.0
+# fixed cost of planning and allocating an FFT-based convolution expressed
+# in multiply-adds of the direct convolution
+_FFT_OVERHEAD = 5e4
+# relative cost of one multiply-add of the sparse convolution, which adds
+# scaled copies of the kernel with one vectorized operation per nonzero value
+_SPARSE_WEIGHT = 1.5
+# fixed cost per nonzero value of the sparse convolution
+_SPARSE_OVERHEAD = 5e3
+# relative cost of one multiply-add of a dot product of the input signal
+# and the kernel
+_DOT_WEIGHT = 2.0
+# fixed cost per output value which is calculated by a dot product
+_DOT_OVERHEAD = 2.5e4
+
+
+def next_fast_len(n):
+    """Returns the next length equal or larger than `n` for which a real
+    FFT is fast (i.e. a 5-smooth number)
+
+    Args
+    ----
+    n : int
+        minimum length
+
+    Returns
+    -------
+    nfft : int
+        fast FFT length
+    """
+    return sp_fft.next_fast_len(int(n), real=True)
+
+
+def _fft_cost(nfft):
+    return _FFT_WEIGHT * nfft * np.log2(max(nfft, 2))
+
+
+def _overlap_add_block(n_input, n_kernel):
+    """Block length of overlap-add convolution with the lowest cost"""
+    best_nb, best_cost = None, np.inf
+    nb = next_fast_len(2 * n_kernel)
+    while nb < 2 * (n_input + n_kernel):
+        step = nb - n_kernel + 1
+        cost = np.ceil(n_input / step) * 2 * _fft_cost(nb) + _fft_cost(nb)
+        if cost < best_cost:
+            best_nb, best_cost = nb, cost
+        nb = next_fast_len(2 * nb)
+
+    return best_nb, best_cost
+
+
+def convolution_cost(n_input, n_kernel, method, nnz=None):
+    """Estimates the cost of a causal convolution
+
+    The cost is expressed in multiply-adds of the direct convolution. Only
+    the first `n_input` samples of the convolution are taken into account.
+
+    Args
+    ----
+    n_input : int
+        length of input signal
+
+    n_kernel : int
+        length of kernel
+
+    method : str
+        convolution method (`direct`, `fft`, `overlap-add` or `sparse`)
+
+    nnz : int, optional
+        number of nonzero values of input signal. By default, the input
+        signal is assumed to be dense.
+
+    Returns
+    -------
+    cost : float
+        estimated cost
+    """
+    n_kernel = min(n_kernel, n_input)
+    if method == "direct":
+        return n_input * n_kernel - n_kernel * (n_kernel - 1) / 2
+    elif method == "fft":
+        nfft = next_fast_len(n_input + n_kernel - 1)
+        return 3 * _fft_cost(nfft) + _FFT_OVERHEAD
+    elif method == "overlap-add":
+        nb, cost = _overlap_add_block(n_input, n_kernel)
+        if nb is None:
+            return np.inf
+        return cost + _FFT_OVERHEAD
+    elif method == "sparse":
+        nnz = n_input if nnz is None else nnz
+        # each nonzero value adds a scaled copy of the kernel
+        return nnz * (n_kernel * _SPARSE_WEIGHT + _SPARSE_OVERHEAD)
+    else:
+        raise ValueError(f"Unknown convolution method '{method}'. Choose from {METHODS[:-1]}.")
+
+
+def choose_method(n_input, n_kernel, nnz=None):
+    """Selects the convolution method with the lowest estimated cost
+
+    Args
+    ----
+    n_input : int
+        length of input signal
+
+    n_kernel : int
+        length of kernel
+
+    nnz : int, optional
+        number of nonzero values of input signal. By default, the input
+        signal is assumed to be dense.
+
+    Returns
+    -------
+    method : str
+        convolution method (`direct`, `fft`, `overlap-add` or `sparse`)
+    """
+    methods = METHODS[:-1] if nnz is not None else METHODS[:-2]
+    costs = {method: convolution_cost(n_input, n_kernel, method, nnz=nnz) for method in methods}
+
+    return min(costs, key=costs.get)
+
+
+def auto_method(input, n_kernel):
+    """Selects the convolution method with the lowest estimated cost for an
+    input signal, taking into account its number of nonzero values
+
+    Args
+    ----
+    input : np.array
+        input signal of shape (n_steps,) or (n_sites, n_steps)
+
+    n_kernel : int
+        length of kernel
+
+    Returns
+    -------
+    method : str
+        convolution method (`direct`, `fft`, `overlap-add` or `sparse`)
+    """
+    input = np.asarray(input)
+    n = input.shape[-1]
+    n_rows = max(input.size // max(n, 1), 1)
+
+    return choose_method(n, n_kernel, nnz=np.count_nonzero(input) / n_rows)
+
+
+def convolve(input, kernel, method="auto"):
+    """Causal convolution of an input signal with a kernel
+
+    Only the first `len(input)` samples of the linear convolution are
+    returned, i.e. the tail after the end of the input is not computed. A
+    two-dimensional input signal of shape (n_sites, n_steps) is convolved
+    row-wise with the same kernel in a single vectorized pass.
+
+    Args
+    ----
+    input : np.array
+        input signal of shape (n_steps,) or (n_sites, n_steps)
+
+    kernel : np.array
+        sampled transfer function of shape (n_steps,) or (n_params, n_steps)
+
+    method : str, optional
+        convolution method (`direct`, `fft`, `overlap-add`, `sparse` or
+        `auto`). If `auto`, the method with the lowest estimated cost is
+        used, taking into account the number of nonzero values of the input
+        signal.
+
+    Returns
+    -------
+    out : np.array
+        output signal of the broadcast shape of input signal and kernel
+    """
+    input = np.asarray(input, dtype=float)
+    kernel = np.asarray(kernel, dtype=float)
+    n = input.shape[-1]
+    kernel = kernel[..., :n]
+    shape = np.broadcast_shapes(input.shape[:-1], kernel.shape[:-1]) + (n,)
+    if n == 0 or kernel.shape[-1] == 0:
+        return np.zeros(shape)
+
+    if method == "auto":
+        method = auto_method(input, kernel.shape[-1])
+
+    if method == "direct":
+        if kernel.ndim == 1:
+            out = signal.lfilter(kernel, [1.0], input, axis=-1)
+        else:
+            input, kernel = np.broadcast_to(input, shape), np.broadcast_to(kernel, shape[:-1] + kernel.shape[-1:])
+            out = np.zeros(shape)
+            for index in np.ndindex(shape[:-1]):
+                out[index] = signal.lfilter(kernel[index], [1.0], input[index])
+    elif method == "fft":
+        spectrum, nfft = rfft_input(input, kernel.shape[-1])
+        out = convolve_spectrum(spectrum, kernel, n, nfft)
+    elif method == "overlap-add":
+        ndim = max(input.ndim, kernel.ndim)
+        input = input.reshape((1,) * (ndim - input.ndim) + input.shape)
+        kernel = kernel.reshape((1,) * (ndim - kernel.ndim) + kernel.shape)
+        out = signal.oaconvolve(input, kernel, mode="full", axes=-1)[..., :n]
+    elif method == "sparse":
+        if input.ndim == 1:
+            out = sparse_convolve(input, kernel)
+        else:
+            input = np.broadcast_to(input, shape)
+            kernel = np.broadcast_to(kernel, shape[:-1] + kernel.shape[-1:])
+            out = np.zeros(shape)
+            for index in np.ndindex(shape[:-1]):
+                out[index] = sparse_convolve(input[index], kernel[index])
+    else:
+        raise ValueError(f"Unknown convolution method '{method}'. Choose from {METHODS}.")
+
+    return out
+
+
+def convolve_at(input, kernel, index, method="auto"):
+    """Causal convolution of an input signal with a kernel at selected time
+    steps
+
+    Each selected output value is either calculated by a dot product of the
+    kernel with the preceding input values (`dot`), which costs one
+    multiply-add per kernel value, or the output is convolved over the
+    window from the first to the last selected time step using the input
+    values from one kernel length before the window. If `auto`, the method
+    with the lowest estimated cost is used.
+
+    Args
+    ----
+    input : np.array
+        input signal of shape (n_steps,) or (n_sites, n_steps)
+
+    kernel : np.array
+        sampled transfer function of shape (n_steps,) or (n_params, n_steps).
+        Kernels of multiple parameter sets are convolved over the window.
+
+    index : np.array
+        selected time steps
+
+    method : str, optional
+        `dot` or convolution method of the window (`direct`, `fft`,
+        `overlap-add`, `sparse` or `auto`)
+
+    Returns
+    -------
+    out : np.array
+        output signal at the selected time steps
+
+    method : str
+        method which has been used
+    """
+    input = np.asarray(input, dtype=float)
+    n = input.shape[-1]
+    index = np.asarray(index, dtype=int)
+    kernel = np.asarray(kernel, dtype=float)[..., :n]
+    m = kernel.shape[-1]
+    if index.size == 0 or m == 0:
+        return np.zeros(input.shape[:-1] + index.shape), method
+    start = max(int(index.min()) - m + 1, 0)
+    stop = int(index.max()) + 1
+
+    if method == "auto":
+        n_rows = max(input.size // max(n, 1), 1)
+        dot_cost = np.sum(np.minimum(index + 1, m)) * n_rows * _DOT_WEIGHT + index.size * _DOT_OVERHEAD
+        window_method = auto_method(input[..., start:stop], m)
+        window_cost = convolution_cost(stop - start, m, window_method) * n_rows
+        method = "dot" if dot_cost <= window_cost and kernel.ndim == 1 else window_method
+
+    if method == "dot":
+        reversed_kernel = kernel[::-1]
+        out = np.zeros(input.shape[:-1] + index.shape)
+        for j, i in enumerate(index):
+            # input values which contribute to the output at time step i
+            first = max(i - m + 1, 0)
+            out[..., j] = input[..., first:i + 1] @ reversed_kernel[m - (i + 1 - first):]
+    else:
+        out = convolve(input[..., start:stop], kernel, method=method)[..., index - start]
+
+    return out, method
+
+
+def rfft_input(input, n_kernel):
+    """Real spectrum of an input signal zero-padded to a fast FFT length
+
+    The spectrum can be reused for convolutions with any kernel of up to
+    `n_kernel` samples.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    n_kernel : int
+        maximum length of kernel
+
+    Returns
+    -------
+    spectrum : np.array
+        spectrum of input signal
+
+    nfft : int
+        FFT length
+    """
+    n = np.shape(input)[-1]
+    nfft = next_fast_len(n + min(n_kernel, n) - 1)
+    spectrum = sp_fft.rfft(input, nfft, axis=-1)
+
+    return spectrum, nfft
+
+
+def convolve_spectrum(spectrum, kernel, n, nfft):
+    """Causal convolution of a precomputed input spectrum with a kernel
+
+    Args
+    ----
+    spectrum : np.array
+        spectrum of input signal (see :func:`rfft_input`)
+
+    kernel : np.array
+        sampled transfer function of shape (n_steps,) or (n_params, n_steps)
+
+    n : int
+        length of input signal
+
+    nfft : int
+        FFT length
+
+    Returns
+    -------
+    out : np.array
+        output signal
+    """
+    kernel = np.asarray(kernel, dtype=float)[..., :n]
+    spec = sp_fft.rfft(kernel, nfft, axis=-1) * spectrum
+    out = sp_fft.irfft(spec, nfft, axis=-1)[..., :n]
+
+    return out
+
+
+def sparse_convolve(input, kernel):
+    """Causal convolution of a sparse input signal with a kernel
+
+    The output is the sum of copies of the kernel which are shifted to the
+    time steps of the nonzero values of the input signal and scaled by
+    these values. The cost is proportional to the number of nonzero
+    values (e.g. a tracer injection) times the length of the kernel.
+
+    Args
+    ----
+    input : np.array
+        input signal of shape (n_steps,)
+
+    kernel : np.array
+        sampled transfer function of shape (n_steps,) or (n_params, n_steps)
+
+    Returns
+    -------
+    out : np.array
+        output signal
+    """
+    input = np.asarray(input, dtype=float)
+    kernel = np.asarray(kernel, dtype=float)
+    n = len(input)
+    out = np.zeros(kernel.shape[:-1] + (n,))
+    n_kernel = kernel.shape[-1]
+    for i in np.flatnonzero(input):
+        stop = min(i + n_kernel, n)
+        out[..., i:stop] += input[i] * kernel[..., :stop - i]
+
+    return out
+
+
+# size of the tiles of the Toeplitz matrix of the explicit convolution
+# (512 x 512 float64 values fit into the L2 cache)
+_TILE_SIZE = 512
+
+
+def explicit_convolve(input, kernel, weight=None):
+    r"""Explicit causal convolution of an input signal with a kernel
+
+    .. math::
+
+        y(k) = \sum_{i=0}^{k} x(i) w(i) h(k-i)
+
+    The Toeplitz matrix of the convolution is split into square tiles. All
+    tiles on the same block diagonal are identical and are taken from a
+    strided view of the kernel, hence the explicit sum is evaluated by one
+    matrix product per block diagonal without a Python loop over time
+    steps. The result is exact up to rounding and serves as reference for
+    the other methods.
+
+    Args
+    ----
+    input : np.array
+        input signal of shape (n_steps,)
+
+    kernel : np.array
+        sampled transfer function of shape (n_steps,)
+
+    weight : np.array, optional
+        weight of input signal (e.g. flux)
+
+    Returns
+    -------
+    out : np.array
+        output signal
+    """
+    input = np.asarray(input, dtype=float)
+    if weight is not None:
+        input = input * np.asarray(weight, dtype=float)
+    n = len(input)
+    size = min(_TILE_SIZE, max(n, 1))
+    n_blocks = -(-n // size)
+    blocks = np.zeros(n_blocks * size)
+    blocks[:n] = input
+    blocks = blocks.reshape(n_blocks, size)
+
+    # tile d holds the kernel values h(d * size + i - j) in row i and column j
+    kernel = np.asarray(kernel, dtype=float)[:n]
+    padded = np.zeros((n_blocks + 2) * size)
+    padded[size:size + len(kernel)] = kernel
+    windows = np.lib.stride_tricks.sliding_window_view(padded, size)[:, ::-1]
+
+    out = np.zeros((n_blocks, size))
+    for d in range(n_blocks):
+        tile = windows[d * size + 1:(d + 1) * size + 1]
+        out[d:] += blocks[:n_blocks - d] @ tile.T
+
+    return out.ravel()[:n]
+
+
+def overlap_save(chunks, kernel, block_size=None):
+    """Causal convolution of a stream of input chunks by overlap-save
+
+    The last `len(kernel) - 1` input values are kept as history and
+    prepended to the next chunk. The convolution of history and chunk is
+    calculated by FFT (or directly for short chunks) and the values which
+    are affected by the circular wrap-around are discarded. Memory usage is
+    proportional to the length of the chunks plus the length of the kernel,
+    regardless of the length of the input stream.
+
+    Args
+    ----
+    chunks : iterable
+        chunks of input signal of shape (len(chunk),) or
+        (n_sites, len(chunk)). All chunks have the same leading dimensions.
+
+    kernel : np.array
+        sampled transfer function of shape (n_steps,) or (n_params, n_steps)
+
+    block_size : int, optional
+        maximum number of time steps which are convolved at once. Longer
+        chunks are split into blocks of this size.
+
+    Yields
+    ------
+    out : np.array
+        chunk of output signal with the same length as the input chunk and
+        of shape (len(chunk),), (n_sites, len(chunk)) or
+        (n_params, len(chunk))
+    """
+    kernel = np.asarray(kernel, dtype=float)
+    m = kernel.shape[-1]
+    history = None
+    spectra = {}
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        if history is None:
+            history = np.zeros(chunk.shape[:-1] + (max(m - 1, 0),))
+        n_chunk = chunk.shape[-1]
+        step = n_chunk if block_size is None else block_size
+        out = np.zeros(np.broadcast_shapes(chunk.shape[:-1], kernel.shape[:-1]) + (n_chunk,))
+        for start in range(0, n_chunk, max(step, 1)):
+            block = chunk[..., start:start + step]
+            segment = np.concatenate((history, block), axis=-1)
+            n_block, n_segment = block.shape[-1], segment.shape[-1]
+            if kernel.ndim == 1 and segment.ndim == 1 and n_block * m <= convolution_cost(n_segment, m, "fft"):
+                out[start:start + n_block] = np.convolve(segment, kernel, mode="valid")
+            else:
+                nfft = next_fast_len(n_segment)
+                if nfft not in spectra:
+                    if len(spectra) >= 4:
+                        spectra.clear()
+                    spectra[nfft] = sp_fft.rfft(kernel, nfft, axis=-1)
+                full = sp_fft.irfft(sp_fft.rfft(segment, nfft, axis=-1) * spectra[nfft], nfft, axis=-1)
+                out[..., start:start + n_block] = full[..., m - 1:n_segment]
+            history = segment[..., n_segment - history.shape[-1]:]
+        yield out
+
+
+class ConvolutionPlan:
+    """Causal convolution with a fixed kernel and input length
+
+    The kernel, its spectrum and the zero-padded input buffer are computed
+    once and reused by each call of :meth:`run`, which pays off if many
+    input signals are convolved with the same kernel (e.g. ensembles of
+    gap-filled input signals).
+
+    Args
+    ----
+    n : int
+        length of input signal
+
+    kernel : np.array
+        sampled transfer function
+
+    method : str, optional
+        convolution method (`direct`, `fft`, `overlap-add`, `sparse` or
+        `auto`). If `auto`, the method is selected from the lengths of the
+        input signal and the kernel, assuming a dense input signal.
+
+    scale : float, optional
+        factor which is applied to the kernel (e.g. incremental time step)
+    """
+
+    def __init__(self, n, kernel, method="auto", scale=1.0):
+        self.n = int(n)
+        self.kernel = np.asarray(kernel, dtype=float)[:self.n] * scale
+        self.kernel.flags.writeable = False
+        if method == "auto":
+            method = choose_method(self.n, len(self.kernel))
+        elif method not in METHODS:
+            raise ValueError(f"Unknown convolution method '{method}'. Choose from {METHODS}.")
+        self.method = method
+        self.nfft = None
+        self.spectrum = None
+        self._buffers = {}
+        if method == "fft" and self.n > 0 and len(self.kernel) > 0:
+            self.nfft = next_fast_len(self.n + len(self.kernel) - 1)
+            self.spectrum = sp_fft.rfft(self.kernel, self.nfft)
+            self.spectrum.flags.writeable = False
+
+    def run(self, input, out=None):
+        """Convolves an input signal with the kernel
+
+        Args
+        ----
+        input : np.array
+            input signal of shape (n,) or (n_sites, n)
+
+        out : np.array, optional
+            array into which the output signal is written
+
+        Returns
+        -------
+        out : np.array
+            output signal
+        """
+        input = np.asarray(input, dtype=float)
+        if input.shape[-1] != self.n:
+            raise ValueError(f"Input signal has {input.shape[-1]} time steps, but the plan has {self.n}.")
+        if out is None:
+            out = np.empty(input.shape)
+
+        if self.spectrum is None:
+            out[...] = convolve(input, self.kernel, method=self.method)
+        else:
+            buffer = self._buffers.get(input.shape[:-1])
+            if buffer is None:
+                # the zero-padding of the buffer is never overwritten
+                buffer = np.zeros(input.shape[:-1] + (self.nfft,))
+                self._buffers[input.shape[:-1]] = buffer
+            buffer[..., :self.n] = input
+            spec = sp_fft.rfft(buffer, axis=-1)
+            spec *= self.spectrum
+            out[...] = sp_fft.irfft(spec, self.nfft, axis=-1, overwrite_x=True)[..., :self.n]
+
+        return out
@@ -0,0 +1,200 @@
+import json
+import numpy as np
+from scipy import signal
+
+from transep import convolution, transep
+
+
+class TransferModel:
+    """Stateful transport model for operational (online) simulations
+
+    The model holds the sampled transfer function and a ring buffer of the
+    recent input values. New input values are simulated by :meth:`update`
+    at a cost proportional to the length of the transfer function per time
+    step. The linear reservoir and parallel linear reservoir transfer
+    functions are evaluated recursively and only hold one state value per
+    reservoir, i.e. the cost per time step is constant.
+
+    The state can be saved to and restored from JSON, so the simulation of
+    a long record does not need to be repeated for each new input value.
+
+    Args
+    ----
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    n_kernel : int
+        maximum length of transfer function
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`transep.transep.truncate_kernel`)
+
+    **kwargs
+        parameters of transfer function
+    """
+
+    def __init__(self, g, dtau, n_kernel, tol=None, **kwargs):
+        self.g = g
+        self.dtau = dtau
+        self.n_kernel = int(n_kernel)
+        self.tol = tol
+        self.params = kwargs
+        self.n_steps = 0
+
+        terms = transep._exponential_terms(g, **kwargs)
+        if terms is not None:
+            self._weights, self._ratios = (np.asarray(term, dtype=float) for term in terms)
+            self._state = np.zeros(len(self._ratios))
+            self.kernel = None
+        else:
+            self.kernel, _ = transep.truncate_kernel(g, self.n_kernel, tol=tol, **kwargs)
+            self._buffer = np.zeros(max(len(self.kernel) - 1, 0))
+            self._position = 0
+
+    @property
+    def recursive(self):
+        """True if the transfer function is evaluated recursively"""
+        return self.kernel is None
+
+    def update(self, new_inputs):
+        """Simulates new input values
+
+        Args
+        ----
+        new_inputs : float, np.array
+            new input values
+
+        Returns
+        -------
+        fout : np.array
+            output signal of the new input values
+        """
+        new_inputs = np.atleast_1d(np.asarray(new_inputs, dtype=float))
+        if len(new_inputs) == 0:
+            return np.zeros(0)
+        elif self.recursive:
+            out = self._update_recursive(new_inputs)
+        else:
+            out = self._update_buffer(new_inputs)
+        self.n_steps += len(new_inputs)
+
+        return out * self.dtau
+
+    def _update_recursive(self, new_inputs):
+        out = np.zeros(len(new_inputs))
+        for i, (w, r) in enumerate(zip(self._weights, self._ratios)):
+            y, _ = signal.lfilter([w * r], [1.0, -r], new_inputs, zi=[r * self._state[i]])
+            self._state[i] = y[-1]
+            out += y
+
+        return out
+
+    def _update_buffer(self, new_inputs):
+        m, size = len(self.kernel), len(self._buffer)
+        # input history in chronological order followed by the new values
+        history = np.concatenate((self._buffer[self._position:], self._buffer[:self._position]))
+        segment = np.concatenate((history, new_inputs))
+        if len(new_inputs) * m <= convolution.convolution_cost(len(segment), m, "fft"):
+            out = np.convolve(segment, self.kernel, mode="valid")
+        else:
+            out = convolution.convolve(segment, self.kernel, method="fft")[size:]
+
+        if size > 0:
+            k = min(len(new_inputs), size)
+            index = (self._position + np.arange(len(new_inputs) - k, len(new_inputs))) % size
+            self._buffer[index] = new_inputs[len(new_inputs) - k:]
+            self._position = (self._position + len(new_inputs)) % size
+
+        return out
+
+    def get_state(self):
+        """Returns the state of the model as JSON-serializable dictionary
+
+        Returns
+        -------
+        state : dict
+            state of the model
+        """
+        state = {
+            "g": self.g.__name__,
+            "dtau": self.dtau,
+            "n_kernel": self.n_kernel,
+            "tol": self.tol,
+            "params": {name: float(value) for name, value in self.params.items()},
+            "n_steps": self.n_steps,
+        }
+        if self.recursive:
+            state["state"] = self._state.tolist()
+        else:
+            # ring buffer is stored in chronological order
+            state["buffer"] = np.concatenate((self._buffer[self._position:], self._buffer[:self._position])).tolist()
+
+        return state
+
+    @classmethod
+    def from_state(cls, state, g=None):
+        """Restores a model from its state
+
+        Args
+        ----
+        state : dict
+            state of the model (see :meth:`get_state`)
+
+        g : function, optional
+            transfer function. By default, the built-in transfer function
+            with the stored name is used.
+
+        Returns
+        -------
+        model : TransferModel
+            restored model
+        """
+        if g is None:
+            g = getattr(transep, state["g"])
+        model = cls(g, state["dtau"], state["n_kernel"], tol=state["tol"], **state["params"])
+        model.n_steps = state["n_steps"]
+        if model.recursive:
+            model._state = np.asarray(state["state"], dtype=float)
+        else:
+            model._buffer = np.asarray(state["buffer"], dtype=float)
+            model._position = 0
+
+        return model
+
+    def save(self, file):
+        """Saves the state of the model to a JSON file
+
+        Args
+        ----
+        file : str, Path
+            path to JSON file
+        """
+        with open(file, "w") as f:
+            json.dump(self.get_state(), f)
+
+    @classmethod
+    def load(cls, file, g=None):
+        """Loads a model from a JSON file
+
+        Args
+        ----
+        file : str, Path
+            path to JSON file
+
+        g : function, optional
+            transfer function. By default, the built-in transfer function
+            with the stored name is used.
+
+        Returns
+        -------
+        model : TransferModel
+            restored model
+        """
+        with open(file, "r") as f:
+            state = json.load(f)
+
+        return cls.from_state(state, g=g)
@@ -0,0 +1,176 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from transep import calibrate
+
+# arrays in shared memory which are attached by a worker process
+_shared = {}
+
+
+class ParallelEvaluator:
+    """Evaluates parameter sets in parallel worker processes
+
+    The input signal and the observations are copied once into shared
+    memory, which is attached by each worker process when it is started.
+    Hence, only the parameter sets are sent to the workers and only the
+    values of the objective functions are sent back. The evaluator holds
+    the worker processes and the shared memory until it is closed and is
+    meant to be used as a context manager.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    obs : np.array
+        observed output signal with the same length as the input signal.
+        Missing observations are NaN.
+
+    n_workers : int, optional
+        number of worker processes. By default, the number of CPUs.
+    """
+
+    def __init__(self, input, obs, n_workers=None):
+        self.n_workers = os.cpu_count() if n_workers is None else int(n_workers)
+        self._memory = []
+        specs = {}
+        for name, array in (("input", input), ("obs", obs)):
+            array = np.asarray(array, dtype=float)
+            memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=float, buffer=memory.buf)[...] = array
+            self._memory.append(memory)
+            specs[name] = (memory.name, array.shape)
+        self._pool = ProcessPoolExecutor(self.n_workers, initializer=_attach, initargs=(specs,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Shuts down the worker processes and releases the shared memory"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def evaluate(self, g, params, dtau=1, batch_size=1024, tol=None, chunk_size=None, chunk_length=None,
+                 objective="nse", threshold=None, full_output=False, **kwargs):
+        """Evaluates the objective functions of many parameter sets
+
+        Args
+        ----
+        g : function
+            transfer function which broadcasts array-valued parameters like
+            the built-in transfer functions. The transfer function is sent
+            to the workers and must be picklable (e.g. defined at the top
+            level of a module).
+
+        params : dict
+            values of each calibrated parameter
+
+        dtau : int, float, optional
+            incremental time step
+
+        batch_size : int, optional
+            number of parameter sets which are evaluated at once by a worker
+
+        tol : float, optional
+            maximum mass of the tail of the transfer functions which is
+            dropped (see :func:`transep.transep.truncate_kernel`)
+
+        chunk_size : int, optional
+            number of parameter sets per task. By default, the parameter
+            sets are split into about four tasks per worker.
+
+        chunk_length : int, optional
+            number of time steps which are simulated at once (see
+            :func:`transep.calibrate.evaluate`)
+
+        objective : str, optional
+            objective function which is bounded by `threshold` (`nse` or
+            `rmse`)
+
+        threshold : float, optional
+            minimum value of NSE or maximum value of RMSE of the
+            behavioural parameter sets. Parameter sets are dropped as soon
+            as they cannot reach the threshold (see
+            :func:`transep.calibrate.evaluate`).
+
+        full_output : bool, optional
+            if True, information on the evaluation is returned as well
+
+        **kwargs
+            fixed parameters of transfer function
+
+        Returns
+        -------
+        scores : dict
+            values of the objective functions of each parameter set (see
+            :func:`transep.calibrate.evaluate`)
+
+        info : dict
+            information on the evaluation (see
+            :func:`transep.calibrate.evaluate`). Only returned if
+            `full_output` is True.
+        """
+        if self._pool is None:
+            raise ValueError("Evaluator has been closed.")
+        params = {name: np.asarray(value) for name, value in params.items()}
+        n_params = len(next(iter(params.values()))) if params else 0
+        if chunk_size is None:
+            # multiple of batch size, so the batches are the same as in a
+            # single process
+            n_batches = -(-n_params // batch_size)
+            chunk_size = max(-(-n_batches // (4 * self.n_workers)), 1) * batch_size
+        chunks = [{name: value[start:start + chunk_size] for name, value in params.items()}
+                  for start in range(0, n_params, chunk_size)]
+        options = dict(dtau=dtau, batch_size=batch_size, tol=tol, chunk_length=chunk_length, objective=objective,
+                       threshold=threshold, full_output=True)
+        futures = [self._pool.submit(_evaluate, g, chunk, options, kwargs) for chunk in chunks]
+        results = [future.result() for future in futures]
+
+        scores = {name: np.concatenate([result[name] for result, _ in results] or [np.zeros(0)])
+                  for name in calibrate.OBJECTIVES}
+        if full_output:
+            simulated_steps = sum(info["simulated_steps"] for _, info in results)
+            total_steps = sum(info["total_steps"] for _, info in results)
+            fft_work = sum(info["fft_work"] for _, info in results)
+            total_fft_work = sum(info["total_fft_work"] for _, info in results)
+            info = {
+                "aborted": np.concatenate([info["aborted"] for _, info in results] or [np.zeros(0, dtype=bool)]),
+                "simulated_steps": simulated_steps,
+                "total_steps": total_steps,
+                "fft_work": fft_work,
+                "total_fft_work": total_fft_work,
+                "work_saved": 1 - fft_work / total_fft_work if total_fft_work > 0 else 0.0,
+            }
+            return scores, info
+
+        return scores
+
+
+def _attach(specs):
+    """Attaches the shared memory in a worker process"""
+    for name, (memory_name, shape) in specs.items():
+        try:
+            # the shared memory is released by the parent process
+            memory = shared_memory.SharedMemory(name=memory_name, track=False)
+        except TypeError:
+            # the worker processes share the resource tracker of the parent
+            # process (Python < 3.13)
+            memory = shared_memory.SharedMemory(name=memory_name)
+        _shared[name] = (memory, np.ndarray(shape, dtype=float, buffer=memory.buf))
+
+
+def _evaluate(g, params, options, kwargs):
+    """Evaluates the objective functions in a worker process"""
+    input, obs = _shared["input"][1], _shared["obs"][1]
+
+    return calibrate.evaluate(input, obs, g, params, **options, **kwargs)
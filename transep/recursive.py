@@ -0,0 +1,255 @@
+import numpy as np
+from scipy import signal
+
+# maximum ratio of the number of rows to the number of columns of the Hankel
+# matrix whose SVD estimates the decay ratios (see fit_exponentials)
+PENCIL_ROW_RATIO = 4
+# minimum magnitude of fitted decay ratios
+MIN_RATIO = 1e-8
+
+
+def exponential_filter(input, weights, ratios):
+    r"""Convolves an input signal with a sum of exponentials by recursion
+
+    The kernel is given by
+
+    .. math::
+
+        h(k) = \sum_{j} w_{j} r_{j}^{k+1} \quad \text { for } \quad k = 0, 1, 2, \ldots
+
+    and each exponential is evaluated as a first-order recursive filter
+
+    .. math::
+
+        y_{j}(t) = r_{j} y_{j}(t-1) + w_{j} r_{j} x(t)
+
+    which is exact and runs in O(n) time without sampling the kernel.
+    Complex weights and ratios (e.g. fitted by :func:`fit_exponentials`)
+    contribute the real part of their exponential, which is evaluated by a
+    real second-order recursion.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    weights : array_like
+        weight of each exponential
+
+    ratios : array_like
+        decay ratio of each exponential per time step (absolute value is
+        between 0 and 1)
+
+    Returns
+    -------
+    out : np.array
+        output signal
+    """
+    input = np.asarray(input, dtype=float)
+    out = np.zeros(input.shape)
+    for w, r in zip(np.atleast_1d(weights), np.atleast_1d(ratios)):
+        if np.iscomplexobj(r) and r.imag != 0:
+            # Re(w r / (1 - r z^-1)) as a real filter
+            b = [(w * r).real, -abs(r)**2 * w.real]
+            a = [1.0, -2 * r.real, abs(r)**2]
+            out += signal.lfilter(b, a, input, axis=-1)
+        else:
+            out += signal.lfilter([(w * r).real], [1.0, -r.real], input, axis=-1)
+
+    return out
+
+
+def fit_exponentials(kernel, tol=1e-3, max_terms=20):
+    r"""Approximates a sampled kernel by a sum of decaying exponentials
+
+    The kernel is approximated by
+
+    .. math::
+
+        h(k) \approx \operatorname{Re} \sum_{j} w_{j} r_{j}^{k+1} \quad \text { for } \quad k = 0, 1, 2, \ldots
+
+    which is evaluated by :func:`exponential_filter` in O(n) time. The
+    decay ratios are estimated by the matrix pencil method (a numerically
+    stable variant of Prony's method) and the weights by least squares.
+    The number of exponentials is increased until the L1 error of the
+    approximation does not exceed `tol`. A pair of complex conjugate
+    exponentials counts as two exponentials and is evaluated by a single
+    complex recursion.
+
+    Args
+    ----
+    kernel : np.array
+        sampled kernel
+
+    tol : float, optional
+        maximum L1 error :math:`\sum_{k=0}^{n-1} |h(k) - \hat{h}(k)|` of the
+        approximation over the length n of the kernel
+
+    max_terms : int, optional
+        maximum number of exponentials
+
+    Returns
+    -------
+    weights : np.array
+        weight of each exponential
+
+    ratios : np.array
+        decay ratio of each exponential per time step
+
+    error : float
+        upper bound of the L1 error of the approximation. The error exceeds
+        `tol` if the kernel cannot be approximated by `max_terms`
+        exponentials, in which case the best approximation is returned.
+    """
+    kernel = np.asarray(kernel, dtype=float)
+    n = len(kernel)
+    if n == 0:
+        return np.zeros(0), np.zeros(0), 0.0
+    # the decay ratios are estimated from the samples before the tail of the
+    # kernel which is negligible compared to the tolerance
+    tail = np.cumsum(np.abs(kernel[::-1]))[::-1]
+    n_fit = max(int(np.sum(tail > tol / 10)), min(2 * max_terms + 2, n))
+    pencil = min(n_fit // 2, 300)
+    hankel = np.lib.stride_tricks.sliding_window_view(kernel[:n_fit], pencil + 1)
+    # every row is a combination of the same exponentials, so a subset of
+    # rows spans the same signal subspace and bounds the cost of the SVD
+    hankel = hankel[::max(len(hankel) // (PENCIL_ROW_RATIO * (pencil + 1)), 1)]
+    _, _, vh = np.linalg.svd(hankel, full_matrices=False)
+
+    k = np.arange(n_fit)[:, np.newaxis]
+    tail_mass = tail[n_fit] if n_fit < n else 0.0
+    best = (np.zeros(0), np.zeros(0), float(np.sum(np.abs(kernel))))
+    for n_terms in range(1, min(max_terms, pencil) + 1):
+        v = vh[:n_terms].T
+        ratios = np.linalg.eigvals(np.linalg.pinv(v[:-1]) @ v[1:])
+        # one of each pair of complex conjugate ratios is kept. Ratios at
+        # zero only describe single samples (e.g. a delay) and are dropped.
+        ratios = ratios[(np.abs(ratios) < 1) & (np.abs(ratios) > MIN_RATIO) & (ratios.imag >= 0)]
+        if len(ratios) == 0:
+            continue
+        # exp(k log r) is faster than the complex power
+        powers = np.exp(k * np.log(ratios))
+        is_complex = ratios.imag > 0
+        design = np.concatenate((powers.real, powers[:, is_complex].imag), axis=1)
+        solution = np.linalg.lstsq(design, kernel[:n_fit], rcond=None)[0]
+        # Re(c z^k) with c = a - ib for the real and imaginary columns
+        coeffs = solution[:len(ratios)].astype(complex)
+        coeffs[is_complex] -= 1j * solution[len(ratios):]
+        # error of the fitted samples plus bounds of the error of the tail
+        # within the kernel length, since later samples do not affect the
+        # output
+        extrapolated = np.abs(ratios)**n_fit * -np.expm1((n - n_fit) * np.log(np.abs(ratios))) / (1 - np.abs(ratios))
+        error = float(np.sum(np.abs(kernel[:n_fit] - (powers @ coeffs).real)) + tail_mass +
+                      np.sum(np.abs(coeffs) * extrapolated))
+        weights = coeffs / ratios
+        if error < best[2]:
+            best = (weights, ratios, error)
+        if error <= tol:
+            break
+    weights, ratios, error = best
+    if np.all(ratios.imag == 0):
+        weights, ratios = weights.real, ratios.real
+
+    return weights, ratios, error
+
+
+def _rising_factorial_coefficients(n):
+    """Coefficients which express the power :math:`s^{n}` as a sum of
+    binomials :math:`\\binom{s+m-1}{m}` for m = 0, ..., n"""
+    # Stirling numbers of the second kind
+    stirling = [[1]]
+    for i in range(1, n + 1):
+        row = [0] * (i + 1)
+        for k in range(1, i + 1):
+            row[k] = (k * stirling[i - 1][k] if k < i else 0) + stirling[i - 1][k - 1]
+        stirling.append(row)
+    coeffs = [(-1) ** (n - m) * stirling[n][m] * int(np.prod(np.arange(1, m + 1))) for m in range(n + 1)]
+
+    return np.array(coeffs, dtype=float)
+
+
+def gamma_cascade(input, order, weight, ratio):
+    r"""Convolves an input signal with an Erlang kernel by a cascade of
+    identical linear reservoirs (Nash cascade)
+
+    The kernel is given by
+
+    .. math::
+
+        h(k) = w (k+1)^{m-1} r^{k+1} \quad \text { for } \quad k = 0, 1, 2, \ldots
+
+    The output of the i-th reservoir of the cascade has the impulse
+    response :math:`\binom{k+i-1}{i-1} r^{k}`. The kernel is an exact linear
+    combination of these responses, hence `order` chained first-order
+    recursions replace the convolution.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    order : int
+        number of linear reservoirs (shape parameter of the Erlang distribution)
+
+    weight : float
+        weight of the kernel
+
+    ratio : float
+        decay ratio per time step (value range is between 0 and 1)
+
+    Returns
+    -------
+    out : np.array
+        output signal
+    """
+    coeffs = _rising_factorial_coefficients(int(order) - 1)
+    stage = np.asarray(input, dtype=float)
+    out = np.zeros(stage.shape)
+    for coeff in coeffs:
+        stage = signal.lfilter([1.0], [1.0, -ratio], stage, axis=-1)
+        if coeff != 0:
+            out += coeff * stage
+
+    return out * weight * ratio
+
+
+def delayed_exponential_filter(input, delay, weight, ratio):
+    r"""Convolves an input signal with a delayed exponential by an index
+    shift and a recursion
+
+    The kernel is given by
+
+    .. math::
+
+        \begin{eqnarray}
+            h(k) & = & w r^{k+1} \quad \text { for } \quad k \geq d \\
+            h(k) & = & 0 \quad \text { for } \quad k < d
+        \end{eqnarray}
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    delay : int
+        delay in time steps
+
+    weight : float
+        weight of the exponential
+
+    ratio : float
+        decay ratio per time step (value range is between 0 and 1)
+
+    Returns
+    -------
+    out : np.array
+        output signal
+    """
+    input = np.asarray(input, dtype=float)
+    out = np.zeros(input.shape)
+    n = input.shape[-1]
+    delay = int(delay)
+    if delay < n:
+        out[..., delay:] = exponential_filter(input[..., :n - delay], weight * ratio**delay, ratio)
+
+    return out
@@ -1,8 +1,27 @@
+import functools
+import inspect
 import numpy as np
-from scipy.special import gamma
-
-
-def convolution_integral(input, g, dtau, **kwargs):
+from scipy import signal
+from scipy import fft as sp_fft
+from scipy.special import comb, digamma, gamma, gammaincc, log_ndtr, ndtr
+
+from transep import cache, composite, convolution, recursive
+
+ENGINES = ("auto", "convolution", "recursive", "cascade", "delay", "spectral", "composite", "prony")
+# maximum shape parameter of gamma transfer function which is evaluated by
+# a cascade of linear reservoirs
+MAX_CASCADE_ORDER = 16
+# number of fitted sums of exponentials which are cached (see
+# fit_exponential_sum)
+FIT_CACHE_SIZE = 128
+# number of aliases on each side of the frequency grid which are summed to
+# obtain the spectrum of a sampled transfer function from its continuous
+# Fourier transform
+N_ALIASES = 8
+
+
+def convolution_integral(input, g, dtau, method="auto", tol=None, full_output=False, at=None, window=None,
+                         **kwargs):
     r"""Calculates convolution integral using fourier transformation
 
     .. math::
@@ -20,19 +39,156 @@ def convolution_integral(input, g, dtau, **kwargs):
     dtau : int, float
         incremental time step
 
+    method : str, optional
+        convolution method (`direct`, `fft`, `overlap-add`, `sparse` or
+        `auto`). If `auto`, the method is selected by a cost model from the
+        lengths of the input signal and the (truncated) transfer function
+        and the number of nonzero values of the input signal.
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`truncate_kernel`). By default, the transfer function is
+        not truncated.
+
+    full_output : bool, optional
+        if True, information on the simulation is returned as well
+
+    at : np.array, optional
+        time step indices or boolean mask of the output values which are
+        calculated (see :func:`transep.convolution.convolve_at`). By
+        default, all output values are calculated.
+
+    window : tuple, optional
+        first and last (exclusive) time step index of the output values
+        which are calculated. Only the input values within the window and
+        within one length of the transfer function before the window are
+        read.
+
     Returns
     -------
     fout : np.array
         output signal
+
+    info : dict
+        selected convolution method (`method`), length of the truncated
+        transfer function (`n_kernel`) and dropped mass (`dropped_mass`).
+        Only returned if `full_output` is True.
     """
-    t = np.arange(1, len(input) + 1)
-    gout = g(t, **kwargs)
-    fout = np.convolve(input, gout, mode='full')[:len(t)] * dtau
+    n = np.shape(input)[-1]
+    if window is not None:
+        if at is not None:
+            raise ValueError("Output time steps are selected by either `at` or `window`.")
+        at = _window_index(window, n)
+    if at is not None:
+        index = np.arange(n)[at]
+        # the transfer function is only required up to the last time step
+        n_max = int(index.max()) + 1 if index.size > 0 else 0
+        gout, dropped_mass = truncate_kernel(g, n_max, tol=tol, **kwargs)
+        fout, method = convolution.convolve_at(input, gout, index, method=method)
+        fout = fout * dtau
+    else:
+        gout, dropped_mass = truncate_kernel(g, n, tol=tol, **kwargs)
+        if method == "auto":
+            method = convolution.auto_method(input, gout.shape[-1])
+        fout = convolution.convolve(input, gout, method=method) * dtau
+
+    if full_output:
+        info = {"method": method, "n_kernel": gout.shape[-1], "dropped_mass": dropped_mass}
+        return fout, info
 
     return fout
 
 
-def convolution_integral_explicit(input, g, dtau, **kwargs):
+def truncate_kernel(g, n, tol=None, **kwargs):
+    """Samples transfer function and truncates its tail
+
+    The transfer function is sampled at t = 1, ..., n and truncated at the
+    shortest length for which the mass of the dropped tail does not exceed
+    `tol`. The tail mass is calculated from the analytic cumulative
+    distribution function of the built-in transfer functions and from the
+    cumulative sum of the sampled transfer function otherwise.
+
+    Args
+    ----
+    g : function
+        transfer function
+
+    n : int
+        number of time steps
+
+    tol : float, optional
+        maximum mass of the dropped tail. By default, the transfer function
+        is not truncated.
+
+    Returns
+    -------
+    gout : np.array
+        truncated transfer function. The array is read-only if it has been
+        cached (see :func:`transep.cache.enable_cache`).
+
+    dropped_mass : float
+        mass of the dropped tail
+    """
+    kernel_cache = cache.get_cache()
+    if kernel_cache is None or _is_batch(**kwargs):
+        return _sample_kernel(g, n, tol=tol, **kwargs)
+
+    key = (g, tuple(sorted(kwargs.items())), n, tol)
+    try:
+        cached = kernel_cache.get(key)
+    except TypeError:
+        # unhashable parameters
+        return _sample_kernel(g, n, tol=tol, **kwargs)
+    if cached is not None:
+        return cached
+    gout, dropped_mass = _sample_kernel(g, n, tol=tol, **kwargs)
+    kernel_cache.put(key, gout, dropped_mass)
+
+    return gout, dropped_mass
+
+
+def _sample_kernel(g, n, tol=None, **kwargs):
+    """Samples transfer function and truncates its tail"""
+    t = np.arange(1, n + 1, dtype=float)
+    if tol is None or n == 0:
+        return g(t, **kwargs), 0.0
+
+    survival = _survival_function(g, **kwargs)
+    if survival is not None:
+        n_kernel, dropped_mass = _analytic_kernel_length(survival, n, tol)
+        gout = g(t[:n_kernel], **kwargs)
+    else:
+        gout = g(t, **kwargs)
+        # mass of tail after each time step
+        tail = np.cumsum(gout[..., ::-1], axis=-1)[..., ::-1]
+        tail = np.max(np.reshape(tail, (-1, n)), axis=0)
+        n_kernel = int(np.argmax(np.append(tail[1:], 0) <= tol)) + 1
+        dropped_mass = float(tail[n_kernel]) if n_kernel < n else 0.0
+        gout = gout[..., :n_kernel]
+
+    return gout, dropped_mass
+
+
+def _analytic_kernel_length(survival, n, tol):
+    """Shortest kernel length whose dropped tail mass does not exceed
+    tolerance using bisection of the survival function"""
+    def tail(length):
+        return float(np.max(survival(float(length)) - survival(float(n))))
+
+    if tail(1) <= tol:
+        return 1, tail(1)
+    lo, hi = 1, n
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if tail(mid) <= tol:
+            hi = mid
+        else:
+            lo = mid
+
+    return hi, max(tail(hi), 0.0)
+
+
+def convolution_integral_explicit(input, g, dtau, weight=None, **kwargs):
     r"""Calculates explicit convolution integral
 
     .. math::
@@ -50,17 +206,563 @@ def convolution_integral_explicit(input, g, dtau, **kwargs):
     dtau : int, float
         incremental time step
 
+    weight : np.array, optional
+        weight of input signal :math:`w` (e.g. flux for flux-weighted
+        concentrations). By default, the input signal is not weighted.
+
     Returns
     -------
     fout : np.array
         output signal
     """
-    t = np.arange(1, len(input) + 1)
+    t = np.arange(1, len(input) + 1, dtype=float)
     gout = g(t, **kwargs)
-    out = np.zeros(len(t))
-    for i in range(1, len(t)):
-        out[i:] = out[i:] + input[i] * gout[:-i]
-    return out
+    fout = convolution.explicit_convolve(input, gout, weight=weight) * dtau
+
+    return fout
+
+
+def recursive_integral(input, g, dtau, **kwargs):
+    r"""Calculates convolution integral using recursive filters
+
+    Transfer functions which are a sum of exponentials (linear reservoir and
+    parallel linear reservoir) are evaluated exactly in a single pass
+    without sampling the transfer function.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    Returns
+    -------
+    fout : np.array
+        output signal
+    """
+    terms = _exponential_terms(g, **kwargs)
+    if terms is None:
+        raise ValueError(f"Transfer function '{g.__name__}' cannot be evaluated recursively.")
+    weights, ratios = terms
+    fout = recursive.exponential_filter(input, weights, ratios) * dtau
+
+    return fout
+
+
+def cascade_integral(input, g, dtau, method="auto", **kwargs):
+    r"""Calculates convolution integral using a cascade of linear reservoirs
+
+    The gamma transfer function with an integer shape parameter is an Erlang
+    distribution, i.e. the transfer function of a cascade of `alpha` identical
+    linear reservoirs, and is evaluated by `alpha` chained recursive
+    filters. Otherwise, the convolution integral is calculated using
+    fourier transformation.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    method : str, optional
+        convolution method if the transfer function cannot be evaluated by
+        a cascade (`direct`, `fft`, `overlap-add` or `auto`)
+
+    Returns
+    -------
+    fout : np.array
+        output signal
+    """
+    if g is not gamma_function:
+        raise ValueError(f"Transfer function '{g.__name__}' cannot be evaluated by a cascade.")
+    terms = _cascade_terms(g, **kwargs)
+    if terms is None:
+        return convolution_integral(input, g, dtau, method=method, **kwargs)
+    order, weight, ratio = terms
+    fout = recursive.gamma_cascade(input, order, weight, ratio) * dtau
+
+    return fout
+
+
+def delay_integral(input, g, dtau, **kwargs):
+    r"""Calculates convolution integral using a delay and a recursive filter
+
+    The exponential-piston transfer function is zero up to the piston flow
+    time :math:`\tau_{m}\left(1-\eta^{-1}\right)` and exponential afterwards.
+    Hence, the input signal is shifted by the piston flow time and
+    evaluated by a single recursive filter without sampling the transfer
+    function.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    Returns
+    -------
+    fout : np.array
+        output signal
+    """
+    terms = _delay_terms(g, **kwargs)
+    if terms is None:
+        raise ValueError(f"Transfer function '{g.__name__}' cannot be evaluated by a delay.")
+    delay, weight, ratio = terms
+    fout = recursive.delayed_exponential_filter(input, delay, weight, ratio) * dtau
+
+    return fout
+
+
+def prony_integral(input, g, dtau, tol=1e-3, max_terms=20, method="auto", **kwargs):
+    r"""Calculates convolution integral using a fitted sum of exponentials
+
+    The transfer function is approximated by a sum of at most `max_terms`
+    exponentials (see :func:`fit_exponential_sum`), which is evaluated by
+    parallel recursive filters in O(n) time. If the transfer function
+    cannot be approximated within `tol`, the convolution integral is
+    calculated using fourier transformation.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    tol : float, optional
+        maximum L1 error of the approximated transfer function
+
+    max_terms : int, optional
+        maximum number of exponentials
+
+    method : str, optional
+        convolution method if the transfer function cannot be approximated
+        (`direct`, `fft`, `overlap-add` or `auto`)
+
+    Returns
+    -------
+    fout : np.array
+        output signal
+    """
+    n = np.shape(input)[-1]
+    try:
+        weights, ratios, error = fit_exponential_sum(g, n, tol=tol, max_terms=max_terms, **kwargs)
+    except np.linalg.LinAlgError:
+        error = np.inf
+    if error > tol:
+        return convolution_integral(input, g, dtau, method=method, **kwargs)
+    fout = recursive.exponential_filter(input, weights, ratios) * dtau
+
+    return fout
+
+
+def fit_exponential_sum(g, n, tol=1e-3, max_terms=20, **kwargs):
+    """Approximates transfer function by a sum of exponentials
+
+    The transfer function is sampled at t = 1, ..., n and approximated by
+    :func:`transep.recursive.fit_exponentials`. The fitted weights and
+    decay ratios are evaluated by
+    :func:`transep.recursive.exponential_filter`, e.g. chunk by chunk for
+    input streams. The fits of the last :data:`FIT_CACHE_SIZE` transfer
+    functions are cached by transfer function, parameters, number of time
+    steps, tolerance and maximum number of exponentials, so repeated
+    simulations of the same model fit the transfer function once. The
+    cached arrays are read-only.
+
+    Args
+    ----
+    g : function
+        transfer function
+
+    n : int
+        number of time steps
+
+    tol : float, optional
+        maximum L1 error of the approximated transfer function
+
+    max_terms : int, optional
+        maximum number of exponentials
+
+    Returns
+    -------
+    weights : np.array
+        weight of each exponential
+
+    ratios : np.array
+        decay ratio of each exponential per time step
+
+    error : float
+        upper bound of the L1 error of the approximated transfer function
+    """
+    terms = _exponential_terms(g, **kwargs)
+    if terms is not None:
+        weights, ratios = terms
+        return np.asarray(weights, dtype=float), np.asarray(ratios, dtype=float), 0.0
+    try:
+        return _cached_fit(g, tuple(sorted(kwargs.items())), n, tol, max_terms)
+    except TypeError:
+        # unhashable parameters
+        return _fit(g, n, tol, max_terms, **kwargs)
+
+
+def _fit(g, n, tol, max_terms, **kwargs):
+    """Samples transfer function and fits a sum of exponentials"""
+    gout, _ = truncate_kernel(g, n, **kwargs)
+
+    return recursive.fit_exponentials(gout, tol=tol, max_terms=max_terms)
+
+
+@functools.lru_cache(maxsize=FIT_CACHE_SIZE)
+def _cached_fit(g, params, n, tol, max_terms):
+    """Cached fit of a sum of exponentials"""
+    weights, ratios, error = _fit(g, n, tol, max_terms, **dict(params))
+    weights.flags.writeable = False
+    ratios.flags.writeable = False
+
+    return weights, ratios, error
+
+
+def spectral_integral(input, g, dtau, tol=None, **kwargs):
+    r"""Calculates convolution integral using the analytic spectrum of the
+    transfer function
+
+    The spectrum of the sampled transfer function is evaluated on the
+    frequency grid of the FFT (see :func:`kernel_spectrum`), hence only the
+    input signal is transformed. The transfer function is truncated at the
+    record length or at the truncation length determined by `tol`. If the
+    spectrum of the truncated transfer function has no closed form, the
+    transfer function is sampled and transformed.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`truncate_kernel`)
+
+    Returns
+    -------
+    fout : np.array
+        output signal
+    """
+    input = np.asarray(input, dtype=float)
+    n = input.shape[-1]
+    n_kernel = n
+    survival = _survival_function(g, **kwargs)
+    if tol is not None and survival is not None and n > 0:
+        n_kernel, _ = _analytic_kernel_length(survival, n, tol)
+    spectrum, nfft = convolution.rfft_input(input, n_kernel)
+    spectrum = spectrum * kernel_spectrum(g, nfft, n_kernel, **kwargs)
+    fout = sp_fft.irfft(spectrum, nfft, axis=-1)[..., :n] * dtau
+
+    return fout
+
+
+def kernel_spectrum(g, nfft, n_kernel, **kwargs):
+    """Spectrum of transfer function sampled at t = 1, ..., `n_kernel` on
+    the frequency grid of a real FFT
+
+    The spectrum is evaluated in closed form for the linear reservoir,
+    exponential-piston and gamma (integer shape parameter) transfer
+    functions, which are truncated geometric series (see e.g.
+    :func:`linear_reservoir_spectrum`). Otherwise, the transfer function is
+    sampled and transformed, which is cheaper than summing the aliases of
+    its Fourier transform (see e.g. :func:`dispersion_spectrum`).
+
+    Args
+    ----
+    g : function
+        transfer function
+
+    nfft : int
+        FFT length
+
+    n_kernel : int
+        number of samples of transfer function
+
+    Returns
+    -------
+    spectrum : np.array
+        spectrum of shape (nfft // 2 + 1,) or (n_params, nfft // 2 + 1)
+    """
+    spectrum = _truncated_spectrum(g, nfft, n_kernel, **kwargs)
+    if spectrum is not None:
+        return spectrum
+    gout, _ = truncate_kernel(g, min(n_kernel, nfft), **kwargs)
+
+    return sp_fft.rfft(gout, nfft, axis=-1)
+
+
+def _spectrum_function(g, **kwargs):
+    """Returns analytic spectrum of transfer function, otherwise None"""
+    if isinstance(g, composite.Composite):
+        return g.spectrum_function()
+    elif g is dispersion_function:
+        return dispersion_spectrum
+    elif g is linear_reservoir_function:
+        return linear_reservoir_spectrum
+    elif g is parallel_linear_reservoir_function:
+        return parallel_linear_reservoir_spectrum
+    elif g is exponential_piston_function:
+        return exponential_piston_spectrum
+    elif g is gamma_function:
+        params = _parameters(g, **kwargs)
+        alpha = np.asarray(params["alpha"], dtype=float)
+        # the alias sum is inaccurate for non-integer alpha <= 1
+        if np.any((alpha <= 1) & (alpha != np.round(alpha))):
+            return None
+        return gamma_spectrum
+
+    return None
+
+
+def _truncated_spectrum(g, nfft, n_kernel, **kwargs):
+    """Spectrum of transfer function sampled at t = 1, ..., `n_kernel` on
+    the frequency grid of a real FFT if it is a truncated geometric series,
+    otherwise None"""
+    if g is linear_reservoir_function:
+        params = _parameters(g, **kwargs)
+        mtt, = _batch(np.zeros(1), params["mtt"])
+        terms = [(1 / mtt, np.exp(-1 / mtt), 0)]
+    elif g is parallel_linear_reservoir_function:
+        params = _parameters(g, **kwargs)
+        mtt_slow, mtt_fast, frac_fast = _batch(np.zeros(1), params["mtt_slow"], params["mtt_fast"],
+                                               params["frac_fast"])
+        terms = [(frac_fast / mtt_fast, np.exp(-1 / mtt_fast), 0),
+                 ((1 - frac_fast) / mtt_slow, np.exp(-1 / mtt_slow), 0)]
+    elif g is exponential_piston_function:
+        params = _parameters(g, **kwargs)
+        mtt, eta = _batch(np.zeros(1), params["mtt"], params["eta"])
+        delay = (np.maximum(np.ceil(mtt * (1 - 1 / eta)), 1) - 1).astype(int)
+        terms = [((eta / mtt) * np.exp(eta - 1), np.exp(-eta / mtt), np.minimum(delay, n_kernel))]
+    else:
+        return None
+
+    # phase factors exp(-i omega k) on the grid are looked up in a table of
+    # the roots of unity, which is faster than evaluating them per parameter
+    # set. The second half of the table is conjugate to the first half.
+    bins = np.arange(nfft // 2 + 1)
+    angle = 2 * np.pi / nfft * bins
+    phase = np.empty(len(bins), dtype=complex)
+    phase.real, phase.imag = np.cos(angle), -np.sin(angle)
+    roots = np.concatenate((phase, np.conj(phase[1:(nfft + 1) // 2][::-1])))
+    shifted = roots[(bins * n_kernel) % nfft]
+    spectrum = 0
+    for weight, ratio, delay in terms:
+        # samples w r^(k + 1) for k = delay, ..., n_kernel - 1
+        numerator = roots[(bins * delay) % nfft] * ratio**delay if np.any(delay > 0) else 1
+        numerator = numerator - ratio**n_kernel * shifted
+        spectrum = spectrum + (weight * ratio) * numerator / (1 - ratio * phase)
+
+    return spectrum
+
+
+def _window_index(window, n):
+    """Returns time step indices of window (first and last, exclusive, time
+    step index with the semantics of a slice)"""
+    start, stop, _ = slice(*window).indices(n)
+
+    return np.arange(start, max(start, stop))
+
+
+def _derivative_function(g):
+    """Returns analytic derivatives of transfer function, otherwise None"""
+    if g is dispersion_function:
+        return dispersion_derivatives
+    elif g is linear_reservoir_function:
+        return linear_reservoir_derivatives
+    elif g is parallel_linear_reservoir_function:
+        return parallel_linear_reservoir_derivatives
+    elif g is exponential_piston_function:
+        return exponential_piston_derivatives
+    elif g is gamma_function:
+        return gamma_derivatives
+
+    return None
+
+
+def _pad_series(input):
+    """Stacks input signals of different length into a zero-padded array
+
+    Zero-padding at the end does not alter the causal convolution of the
+    preceding time steps.
+    """
+    lengths = [len(series) for series in input]
+    padded = np.zeros((len(lengths), max(lengths, default=0)))
+    for i, series in enumerate(input):
+        padded[i, :lengths[i]] = series
+
+    return padded, lengths
+
+
+def _batch(tau, *params):
+    """Appends an axis to array-valued parameters so that transfer functions
+    broadcast to shape (n_params, n_steps)"""
+    # integer parameters would fail on negative powers
+    params = tuple(np.asarray(param, dtype=float) for param in params)
+    if np.ndim(tau) == 0:
+        return params
+
+    return tuple(param[..., np.newaxis] if param.ndim > 0 else param for param in params)
+
+
+def _parameters(g, **kwargs):
+    """Returns parameters of transfer function including default values"""
+    bound = inspect.signature(g).bind(None, **kwargs)
+    bound.apply_defaults()
+    params = dict(bound.arguments)
+    del params[next(iter(params))]
+
+    return params
+
+
+def _is_batch(**kwargs):
+    """Checks whether any parameter of transfer function is array-valued"""
+    return any(np.ndim(value) > 0 for value in kwargs.values())
+
+
+def _batch_parameters(params):
+    """Broadcasts parameters to one-dimensional arrays of equal length"""
+    names = list(params)
+    values = np.broadcast_arrays(*[np.atleast_1d(np.asarray(params[name], dtype=float)) for name in names])
+    if any(value.ndim != 1 for value in values):
+        raise ValueError("Parameters must be scalars or one-dimensional arrays.")
+
+    return dict(zip(names, values))
+
+
+def _exponential_terms(g, **kwargs):
+    """Returns weights and decay ratios if transfer function is a sum of
+    exponentials, otherwise None"""
+    if _is_batch(**kwargs):
+        return None
+    if g is linear_reservoir_function:
+        params = _parameters(g, **kwargs)
+        weights = [1 / params["mtt"]]
+        ratios = [np.exp(-1 / params["mtt"])]
+    elif g is parallel_linear_reservoir_function:
+        params = _parameters(g, **kwargs)
+        weights = [params["frac_fast"] / params["mtt_fast"], (1 - params["frac_fast"]) / params["mtt_slow"]]
+        ratios = [np.exp(-1 / params["mtt_fast"]), np.exp(-1 / params["mtt_slow"])]
+    else:
+        return None
+
+    return weights, ratios
+
+
+def _cascade_terms(g, **kwargs):
+    """Returns order, weight and decay ratio if transfer function is an
+    Erlang distribution, otherwise None"""
+    if g is not gamma_function or _is_batch(**kwargs):
+        return None
+    params = _parameters(g, **kwargs)
+    alpha, beta = params["alpha"], params["beta"]
+    if alpha != int(alpha) or not 1 <= alpha <= MAX_CASCADE_ORDER:
+        return None
+    order = int(alpha)
+    weight = 1 / (beta**order * gamma(order))
+    ratio = np.exp(-1 / beta)
+
+    return order, weight, ratio
+
+
+def _delay_terms(g, **kwargs):
+    """Returns delay, weight and decay ratio if transfer function is a
+    delayed exponential, otherwise None"""
+    if g is not exponential_piston_function or _is_batch(**kwargs):
+        return None
+    params = _parameters(g, **kwargs)
+    mtt, eta = params["mtt"], params["eta"]
+    # first time step (t = 1, 2, ...) at which the piston flow time is reached
+    t_piston = max(np.ceil(mtt * (1 - 1 / eta)), 1)
+    delay = int(t_piston) - 1
+    ratio = np.exp(-eta / mtt)
+    weight = (eta / mtt) * np.exp(eta - 1)
+
+    return delay, weight, ratio
+
+
+def _survival_function(g, **kwargs):
+    """Returns analytic survival function (1 - cumulative distribution
+    function) of transfer function, otherwise None"""
+    if isinstance(g, composite.Composite):
+        return g.survival_function()
+    elif g is dispersion_function:
+        params = _parameters(g, **kwargs)
+
+        def survival(tau):
+            # inverse Gaussian distribution with mean mtt and shape mtt / (2 * p_d)
+            p_d, mtt = params["p_d"], params["mtt"]
+            x = np.sqrt(mtt / (2 * p_d * tau))
+            cdf = ndtr(x * (tau / mtt - 1)) + np.exp(1 / p_d + log_ndtr(-x * (tau / mtt + 1)))
+            return 1 - cdf
+    elif g is linear_reservoir_function:
+        params = _parameters(g, **kwargs)
+
+        def survival(tau):
+            return np.exp(-tau / params["mtt"])
+    elif g is parallel_linear_reservoir_function:
+        params = _parameters(g, **kwargs)
+
+        def survival(tau):
+            return (params["frac_fast"] * np.exp(-tau / params["mtt_fast"]) +
+                    (1 - params["frac_fast"]) * np.exp(-tau / params["mtt_slow"]))
+    elif g is exponential_piston_function:
+        params = _parameters(g, **kwargs)
+
+        def survival(tau):
+            mtt, eta = params["mtt"], params["eta"]
+            return np.where(tau >= mtt * (1 - 1 / eta), np.exp(-eta * tau / mtt + eta - 1), 1.0)
+    elif g is gamma_function:
+        params = _parameters(g, **kwargs)
+
+        def survival(tau):
+            return gammaincc(params["alpha"], tau / params["beta"])
+    else:
+        return None
+
+    return survival
+
+
+def _select_engine(g, **kwargs):
+    """Selects the fastest engine which is available for transfer function"""
+    if isinstance(g, composite.Composite):
+        return g.engine()
+    elif _exponential_terms(g, **kwargs) is not None:
+        return "recursive"
+    elif _cascade_terms(g, **kwargs) is not None:
+        return "cascade"
+    elif _delay_terms(g, **kwargs) is not None:
+        return "delay"
+
+    return "convolution"
 
 
 def dispersion_function(tau, p_d=0.1, mtt=40):
@@ -81,18 +783,20 @@ def dispersion_function(tau, p_d=0.1, mtt=40):
     tau : float, np.array
         time step increment
 
-    p_d : float
+    p_d : float, np.array
         dispersion parameter
 
-    mtt : float
+    mtt : float, np.array
         mean travel time
 
     Returns
     -------
     gout : float, np.array
-        travel time distribution
+        travel time distribution. If parameters are arrays of length
+        n_params, an array of shape (n_params, n_steps) is returned.
     """
-    gout = (1 / tau * np.sqrt(4*np.pi*p_d*(tau/mtt))) * np.exp(-(1 - (tau/mtt))**2 / (4*p_d*(tau/mtt)))
+    p_d, mtt = _batch(tau, p_d, mtt)
+    gout = (1 / (tau * np.sqrt(4*np.pi*p_d*(tau/mtt)))) * np.exp(-(1 - (tau/mtt))**2 / (4*p_d*(tau/mtt)))
 
     return gout
 
@@ -113,14 +817,16 @@ def linear_reservoir_function(tau, mtt=40):
     tau : float, np.array
         time step increment
 
-    mtt : float
+    mtt : float, np.array
         mean travel time
 
     Returns
     -------
     gout : float, np.array
-        travel time distribution
+        travel time distribution. If parameters are arrays of length
+        n_params, an array of shape (n_params, n_steps) is returned.
     """
+    mtt, = _batch(tau, mtt)
     gout = (1 / mtt) * np.exp(-tau/mtt)
 
     return gout
@@ -142,20 +848,22 @@ def parallel_linear_reservoir_function(tau, mtt_slow=40, mtt_fast=10, frac_fast=
     tau : float, np.array
         time step increment
 
-    mtt_slow : float
+    mtt_slow : float, np.array
         mean travel time of slow reservoir
 
-    mtt_fast : float
+    mtt_fast : float, np.array
         mean travel time of fast reservoir
 
-    frac_fast : float
+    frac_fast : float, np.array
         fraction of fast reservoir (value range is between 0 and 1)
 
     Returns
     -------
     gout : float, np.array
-        travel time distribution
+        travel time distribution. If parameters are arrays of length
+        n_params, an array of shape (n_params, n_steps) is returned.
     """
+    mtt_slow, mtt_fast, frac_fast = _batch(tau, mtt_slow, mtt_fast, frac_fast)
     gout = (frac_fast / mtt_fast) * np.exp(-tau/mtt_fast) + ((1 - frac_fast)/mtt_slow) * np.exp(-tau/mtt_slow)
 
     return gout
@@ -181,20 +889,21 @@ def exponential_piston_function(tau, mtt=40, eta=1):
     tau : float, np.array
         time step increment
 
-    mtt : float
+    mtt : float, np.array
         mean travel time
 
-    eta : float
+    eta : float, np.array
         parameter which equals the total volume of water divided by the
         exponential flow volume
 
     Returns
     -------
     gout : float, np.array
-        travel time distribution
+        travel time distribution. If parameters are arrays of length
+        n_params, an array of shape (n_params, n_steps) is returned.
     """
-
-    gout = np.where(tau >= mtt * (1 - eta**(-1)), (eta/mtt) * np.exp(((-eta**tau)/mtt) + eta - 1), 0)
+    mtt, eta = _batch(tau, mtt, eta)
+    gout = np.where(tau >= mtt * (1 - 1 / eta), (eta/mtt) * np.exp(((-eta*tau)/mtt) + eta - 1), 0)
 
     return gout
 
@@ -216,114 +925,940 @@ def gamma_function(tau, alpha=1, beta=1):
     tau : float, np.array
         time step
 
-    alpha : float
-        scale parameter
-
-    beta : float
+    alpha : float, np.array
         shape parameter
 
+    beta : float, np.array
+        scale parameter
+
     Returns
     -------
     gout : float, np.array
-        travel time distribution
+        travel time distribution. If parameters are arrays of length
+        n_params, an array of shape (n_params, n_steps) is returned.
     """
-    gout = (tau**(alpha-1) / (beta**alpha) * gamma(alpha)) * np.exp(-tau/beta)
+    alpha, beta = _batch(tau, alpha, beta)
+    gout = (tau**(alpha-1) / ((beta**alpha) * gamma(alpha))) * np.exp(-tau/beta)
 
     return gout
 
 
-def loss_function(prec, b1, b2, b3):
-    r"""Loss function to generate effective precipitation
+def _alias_sum(fourier_transform, omega, antiderivative=None):
+    """Spectrum of the transfer function sampled at t = 1, 2, ... from its
+    continuous Fourier transform (Poisson summation)
 
-    .. math::
+    The aliases beyond `N_ALIASES` are approximated by the integral of the
+    Fourier transform if its antiderivative is given.
+    """
+    omega = np.asarray(omega, dtype=float)
+    spectrum = np.zeros(np.broadcast(omega, fourier_transform(omega)).shape, dtype=complex)
+    for m in range(-N_ALIASES, N_ALIASES + 1):
+        spectrum += fourier_transform(omega + 2 * np.pi * m)
+    if antiderivative is not None:
+        # midpoint rule for the remaining aliases on both sides
+        edge = 2 * np.pi * (N_ALIASES + 0.5)
+        spectrum += (antiderivative(omega - edge) - antiderivative(omega + edge)) / (2 * np.pi)
 
-        \begin{eqnarray}
-            s(t )& = & b_{1} p(t)+\left(1-b_{2}^{-1}\right) s(t-\Delta t) \\
-            s(t=0) & = & b_{3} \\
-            p_{eff}(t) & = & p(t) s(t)
-        \end{eqnarray}
+    # shift by one time step since the first sample is taken at t = 1
+    return np.exp(1j * omega) * spectrum
 
 
-    Weiler, M., McGlynn, B. L., McGuire, K. J., and McDonnell, J. J.: How does
-    rainfall become runoff? A combined tracer and runoff transfer function
-    approach, Water Resources Research, 39, https://doi.org/10.1029/2003wr002331,
-    2003.
+def dispersion_spectrum(omega, p_d=0.1, mtt=40):
+    r"""Spectrum of the sampled dispersive transfer function
+
+    The dispersive transfer function is an inverse Gaussian distribution
+    with the Fourier transform
+
+    .. math::
+
+        G(\omega) = \exp \left[\frac{1 - \sqrt{1 + 4 P_{D} T_{m} i \omega}}{2 P_{D}}\right]
+
+    The spectrum of the transfer function sampled at :math:`\tau = 1, 2, \ldots`
+    is obtained by summing the aliases of :math:`G`.
 
     Args
     ----
-    prec : np.array
-        precipitation
+    omega : np.array
+        angular frequency per time step
 
-    b1 : float
-        parameter
-
-    b2 : float
-        parameter to exponentially weigh the precipitation backward in time
+    p_d : float, np.array
+        dispersion parameter
 
-    b3 : float
-        initial antecedent precipitation index
+    mtt : float, np.array
+        mean travel time
 
     Returns
     -------
-    prec_eff : float, np.array
-        effective precipitation
+    spectrum : np.array
+        spectrum of sampled transfer function
     """
-    s_t = np.zeros((len(prec),))
-    prec_eff = np.zeros((len(prec),))
-    for t in range(len(prec)):
-        if t == 0:
-            s_t[t] = b1 * prec[t] + (1 - b2**-1) * b3
-        else:
-            s_t[t] = b1 * prec[t] + (1 - b2**-1) * s_t[t-1]
+    p_d, mtt = _batch(omega, p_d, mtt)
 
-    prec_eff = prec * s_t
+    def fourier_transform(w):
+        return np.exp((1 - np.sqrt(1 + 4 * p_d * mtt * 1j * w)) / (2 * p_d))
 
-    return prec_eff
+    return _alias_sum(fourier_transform, omega)
 
 
-def simulate(input, g, dtau, **kwargs):
-    """Runs simulation of transport model
+def linear_reservoir_spectrum(omega, mtt=40):
+    r"""Spectrum of the sampled linear reservoir transfer function
+
+    .. math::
+
+        H(\omega) = \frac{1}{\tau_{\mathrm{m}}} \frac{r}{1 - r e^{-i \omega}}, \quad r = \exp \left(\frac{-1}{\tau_{\mathrm{m}}}\right)
 
     Args
     ----
-    input : np.array
-        input signal
+    omega : np.array
+        angular frequency per time step
 
-    g : function
-        transfer function
-
-    dtau : int, float
-        incremental time step
+    mtt : float, np.array
+        mean travel time
 
     Returns
     -------
-    fout : np.array
-        output signal
+    spectrum : np.array
+        spectrum of sampled transfer function
     """
-    out = convolution_integral(input, g, dtau, **kwargs)
+    mtt, = _batch(omega, mtt)
+    ratio = np.exp(-1 / mtt)
 
-    return out
+    return (1 / mtt) * ratio / (1 - ratio * np.exp(-1j * omega))
 
 
-def simulate_explicit(input, g, dtau, **kwargs):
-    """Runs simulation of transport model
+def parallel_linear_reservoir_spectrum(omega, mtt_slow=40, mtt_fast=10, frac_fast=0.1):
+    r"""Spectrum of the sampled parallel linear reservoir transfer function
+
+    .. math::
+
+        H(\omega) = \phi H_{\mathrm{f}}(\omega) + (1 - \phi) H_{\mathrm{s}}(\omega)
+
+    where :math:`H_{\mathrm{f}}` and :math:`H_{\mathrm{s}}` are the spectra of
+    the linear reservoirs (see :func:`linear_reservoir_spectrum`).
 
     Args
     ----
-    input : np.array
-        input signal
+    omega : np.array
+        angular frequency per time step
 
-    g : function
-        transfer function
+    mtt_slow : float, np.array
+        mean travel time of slow reservoir
 
-    dtau : int, float
-        incremental time step
+    mtt_fast : float, np.array
+        mean travel time of fast reservoir
+
+    frac_fast : float, np.array
+        fraction of fast reservoir (value range is between 0 and 1)
+
+    Returns
+    -------
+    spectrum : np.array
+        spectrum of sampled transfer function
+    """
+    frac_fast, = _batch(omega, frac_fast)
+    spectrum = (frac_fast * linear_reservoir_spectrum(omega, mtt=mtt_fast) +
+                (1 - frac_fast) * linear_reservoir_spectrum(omega, mtt=mtt_slow))
+
+    return spectrum
+
+
+def exponential_piston_spectrum(omega, mtt=40, eta=1):
+    r"""Spectrum of the sampled exponential-piston transfer function
+
+    .. math::
+
+        H(\omega) = \frac{\eta}{\tau_{m}} e^{\eta - 1} \frac{r^{d+1} e^{-i \omega d}}{1 - r e^{-i \omega}}, \quad r = \exp \left(\frac{-\eta}{\tau_{m}}\right)
+
+    where :math:`d` is the delay of the first nonzero sample at
+    :math:`\tau \geq \tau_{m}\left(1-\eta^{-1}\right)`.
+
+    Args
+    ----
+    omega : np.array
+        angular frequency per time step
+
+    mtt : float, np.array
+        mean travel time
+
+    eta : float, np.array
+        parameter which equals the total volume of water divided by the
+        exponential flow volume
+
+    Returns
+    -------
+    spectrum : np.array
+        spectrum of sampled transfer function
+    """
+    mtt, eta = _batch(omega, mtt, eta)
+    delay = np.maximum(np.ceil(mtt * (1 - 1 / eta)), 1) - 1
+    ratio = np.exp(-eta / mtt)
+    weight = (eta / mtt) * np.exp(eta - 1)
+    spectrum = weight * ratio**(delay + 1) * np.exp(-1j * omega * delay) / (1 - ratio * np.exp(-1j * omega))
+
+    return spectrum
+
+
+def gamma_spectrum(omega, alpha=1, beta=1):
+    r"""Spectrum of the sampled gamma transfer function
+
+    For an integer shape parameter, the spectrum is given exactly by the
+    cascade of linear reservoirs (see :func:`transep.recursive.gamma_cascade`)
+
+    .. math::
+
+        H(\omega) = w r \sum_{m=0}^{\alpha-1} \frac{c_{m}}{\left(1 - r e^{-i \omega}\right)^{m+1}}, \quad r = \exp \left(\frac{-1}{\beta}\right)
+
+    Otherwise, the aliases of the Fourier transform
+
+    .. math::
+
+        G(\omega) = \left(1 + i \omega \beta\right)^{-\alpha}
+
+    are summed, which requires :math:`\alpha > 1`. Otherwise, a ValueError
+    is raised.
+
+    Args
+    ----
+    omega : np.array
+        angular frequency per time step
+
+    alpha : float, np.array
+        shape parameter
+
+    beta : float, np.array
+        scale parameter
+
+    Returns
+    -------
+    spectrum : np.array
+        spectrum of sampled transfer function
+    """
+    omega = np.asarray(omega, dtype=float)
+    alpha, beta = np.broadcast_arrays(np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float))
+    is_cascade = (alpha == np.round(alpha)) & (alpha >= 1) & (alpha <= MAX_CASCADE_ORDER)
+    if np.any(~is_cascade & (alpha <= 1)):
+        raise ValueError("Spectrum of gamma transfer function requires an integer shape parameter or alpha > 1.")
+    # the parameter sets are split into cascades and alias sums, and a
+    # scalar shape parameter is indexed as an array of length one
+    spectrum = np.zeros(alpha.shape + omega.shape, dtype=complex)
+    if np.any(is_cascade):
+        spectrum[is_cascade] = _gamma_cascade_spectrum(omega, alpha[is_cascade], beta[is_cascade])
+    if np.any(~is_cascade):
+        spectrum[~is_cascade] = _gamma_alias_spectrum(omega, alpha[~is_cascade], beta[~is_cascade])
+
+    return spectrum
+
+
+def _gamma_cascade_spectrum(omega, order, beta):
+    """Spectrum of gamma transfer functions with integer shape parameters of
+    shape (n_params,) as cascades of linear reservoirs"""
+    order, beta = order[:, np.newaxis], beta[:, np.newaxis]
+    n_orders = int(np.max(order))
+    # coefficients of the powers of a stage for each order
+    table = np.zeros((n_orders, n_orders))
+    for i in range(n_orders):
+        table[i, :i + 1] = recursive._rising_factorial_coefficients(i)
+    index = order.astype(int) - 1
+    ratio = np.exp(-1 / beta)
+    weight = 1 / (beta**order * gamma(order))
+    stage = 1 / (1 - ratio * np.exp(-1j * omega))
+    spectrum = np.zeros(np.broadcast(stage, order).shape, dtype=complex)
+    power = stage
+    for m in range(n_orders):
+        spectrum += table[index, m] * power
+        power = power * stage
+
+    return weight * ratio * spectrum
+
+
+def _gamma_alias_spectrum(omega, alpha, beta):
+    """Spectrum of gamma transfer functions with shape parameters
+    alpha > 1 of shape (n_params,) by summing aliases"""
+    alpha, beta = alpha[:, np.newaxis], beta[:, np.newaxis]
+
+    def fourier_transform(w):
+        return (1 + 1j * w * beta)**(-alpha)
+
+    def antiderivative(w):
+        return (1 + 1j * w * beta)**(1 - alpha) / ((1 - alpha) * 1j * beta)
+
+    return _alias_sum(fourier_transform, omega, antiderivative=antiderivative)
+
+
+def dispersion_derivatives(tau, p_d=0.1, mtt=40):
+    r"""Derivatives of the dispersive transfer function with respect to its
+    parameters
+
+    .. math::
+
+        \begin{eqnarray}
+            \frac{\partial g}{\partial P_{D}} & = & g \left[\frac{(1-u)^{2}}{4 P_{D}^{2} u}-\frac{1}{2 P_{D}}\right] \\
+            \frac{\partial g}{\partial T_{m}} & = & \frac{g}{T_{m}} \left[\frac{1}{2}+\frac{u-u^{-1}}{4 P_{D}}\right]
+        \end{eqnarray}
+
+    with :math:`u = \tau / T_{m}`.
+
+    Args
+    ----
+    tau : float, np.array
+        time step increment
+
+    p_d : float, np.array
+        dispersion parameter
+
+    mtt : float, np.array
+        mean travel time
+
+    Returns
+    -------
+    derivatives : dict
+        derivative of transfer function with respect to each parameter
+    """
+    gout = dispersion_function(tau, p_d=p_d, mtt=mtt)
+    p_d, mtt = _batch(tau, p_d, mtt)
+    u = tau / mtt
+
+    return {
+        "p_d": gout * ((1 - u)**2 / (4 * p_d**2 * u) - 1 / (2 * p_d)),
+        "mtt": gout / mtt * (0.5 + (u - 1 / u) / (4 * p_d)),
+    }
+
+
+def linear_reservoir_derivatives(tau, mtt=40):
+    r"""Derivatives of the linear reservoir transfer function with respect to
+    its parameters
+
+    .. math::
+
+        \frac{\partial g}{\partial \tau_{\mathrm{m}}} = \frac{g}{\tau_{\mathrm{m}}} \left(\frac{\tau}{\tau_{\mathrm{m}}}-1\right)
+
+    Args
+    ----
+    tau : float, np.array
+        time step increment
+
+    mtt : float, np.array
+        mean travel time
+
+    Returns
+    -------
+    derivatives : dict
+        derivative of transfer function with respect to each parameter
+    """
+    gout = linear_reservoir_function(tau, mtt=mtt)
+    mtt, = _batch(tau, mtt)
+
+    return {"mtt": gout / mtt * (tau / mtt - 1)}
+
+
+def parallel_linear_reservoir_derivatives(tau, mtt_slow=40, mtt_fast=10, frac_fast=0.1):
+    r"""Derivatives of the parallel linear reservoir transfer function with
+    respect to its parameters
+
+    .. math::
+
+        \begin{eqnarray}
+            \frac{\partial g}{\partial \tau_{\mathrm{s}}} & = & \frac{1-\phi}{\tau_{\mathrm{s}}^{2}} \exp \left(-\frac{\tau}{\tau_{\mathrm{s}}}\right) \left(\frac{\tau}{\tau_{\mathrm{s}}}-1\right) \\
+            \frac{\partial g}{\partial \tau_{\mathrm{f}}} & = & \frac{\phi}{\tau_{\mathrm{f}}^{2}} \exp \left(-\frac{\tau}{\tau_{\mathrm{f}}}\right) \left(\frac{\tau}{\tau_{\mathrm{f}}}-1\right) \\
+            \frac{\partial g}{\partial \phi} & = & \frac{1}{\tau_{\mathrm{f}}} \exp \left(-\frac{\tau}{\tau_{\mathrm{f}}}\right)-\frac{1}{\tau_{\mathrm{s}}} \exp \left(-\frac{\tau}{\tau_{\mathrm{s}}}\right)
+        \end{eqnarray}
+
+    Args
+    ----
+    tau : float, np.array
+        time step increment
+
+    mtt_slow : float, np.array
+        mean travel time of slow reservoir
+
+    mtt_fast : float, np.array
+        mean travel time of fast reservoir
+
+    frac_fast : float, np.array
+        fraction of fast reservoir (value range is between 0 and 1)
+
+    Returns
+    -------
+    derivatives : dict
+        derivative of transfer function with respect to each parameter
+    """
+    mtt_slow, mtt_fast, frac_fast = _batch(tau, mtt_slow, mtt_fast, frac_fast)
+    slow = np.exp(-tau/mtt_slow) / mtt_slow
+    fast = np.exp(-tau/mtt_fast) / mtt_fast
+
+    return {
+        "mtt_slow": (1 - frac_fast) * slow / mtt_slow * (tau / mtt_slow - 1),
+        "mtt_fast": frac_fast * fast / mtt_fast * (tau / mtt_fast - 1),
+        "frac_fast": fast - slow,
+    }
+
+
+def exponential_piston_derivatives(tau, mtt=40, eta=1):
+    r"""Derivatives of the exponential-piston transfer function with respect
+    to its parameters
+
+    .. math::
+
+        \begin{eqnarray}
+            \frac{\partial g}{\partial \tau_{m}} & = & \frac{g}{\tau_{m}} \left(\frac{\eta \tau}{\tau_{m}}-1\right) \\
+            \frac{\partial g}{\partial \eta} & = & g \left(\frac{1}{\eta}-\frac{\tau}{\tau_{m}}+1\right)
+        \end{eqnarray}
+
+    The shift of the piston flow time, at which the transfer function jumps
+    from zero, is not taken into account, since it does not change the
+    transfer function sampled at fixed time steps unless it passes a time
+    step.
+
+    Args
+    ----
+    tau : float, np.array
+        time step increment
+
+    mtt : float, np.array
+        mean travel time
+
+    eta : float, np.array
+        parameter which equals the total volume of water divided by the
+        exponential flow volume
+
+    Returns
+    -------
+    derivatives : dict
+        derivative of transfer function with respect to each parameter
+    """
+    gout = exponential_piston_function(tau, mtt=mtt, eta=eta)
+    mtt, eta = _batch(tau, mtt, eta)
+
+    return {
+        "mtt": gout / mtt * (eta * tau / mtt - 1),
+        "eta": gout * (1 / eta - tau / mtt + 1),
+    }
+
+
+def gamma_derivatives(tau, alpha=1, beta=1):
+    r"""Derivatives of the gamma transfer function with respect to its
+    parameters
+
+    .. math::
+
+        \begin{eqnarray}
+            \frac{\partial g}{\partial \alpha} & = & g \left[\ln \left(\frac{\tau}{\beta}\right)-\psi(\alpha)\right] \\
+            \frac{\partial g}{\partial \beta} & = & \frac{g}{\beta} \left(\frac{\tau}{\beta}-\alpha\right)
+        \end{eqnarray}
+
+    with the digamma function :math:`\psi`.
+
+    Args
+    ----
+    tau : float, np.array
+        time step
+
+    alpha : float, np.array
+        shape parameter
+
+    beta : float, np.array
+        scale parameter
+
+    Returns
+    -------
+    derivatives : dict
+        derivative of transfer function with respect to each parameter
+    """
+    gout = gamma_function(tau, alpha=alpha, beta=beta)
+    alpha, beta = _batch(tau, alpha, beta)
+
+    return {
+        "alpha": gout * (np.log(tau / beta) - digamma(alpha)),
+        "beta": gout / beta * (tau / beta - alpha),
+    }
+
+
+def loss_function(prec, b1, b2, b3):
+    r"""Loss function to generate effective precipitation
+
+    .. math::
+
+        \begin{eqnarray}
+            s(t )& = & b_{1} p(t)+\left(1-b_{2}^{-1}\right) s(t-\Delta t) \\
+            s(t=0) & = & b_{3} \\
+            p_{eff}(t) & = & p(t) s(t)
+        \end{eqnarray}
+
+
+    Weiler, M., McGlynn, B. L., McGuire, K. J., and McDonnell, J. J.: How does
+    rainfall become runoff? A combined tracer and runoff transfer function
+    approach, Water Resources Research, 39, https://doi.org/10.1029/2003wr002331,
+    2003.
+
+    Args
+    ----
+    prec : np.array
+        precipitation
+
+    b1 : float
+        parameter
+
+    b2 : float
+        parameter to exponentially weigh the precipitation backward in time
+
+    b3 : float
+        initial antecedent precipitation index
+
+    Returns
+    -------
+    prec_eff : float, np.array
+        effective precipitation
+    """
+    prec = np.asarray(prec, dtype=float)
+    a = 1 - b2**-1
+    # first-order recursion evaluated as linear filter with initial state
+    zi = np.full(prec.shape[:-1] + (1,), a * b3)
+    s_t = signal.lfilter([b1], [1.0, -a], prec, axis=-1, zi=zi)[0]
+    prec_eff = prec * s_t
+
+    return prec_eff
+
+
+def loss_function_batch(prec, b1, b2, b3):
+    """Loss function to generate effective precipitation for many parameter
+    sets and precipitation time series at once
+
+    The result is identical to calling :func:`loss_function` for each
+    parameter set and precipitation time series.
+
+    Args
+    ----
+    prec : np.array
+        precipitation of shape (n_steps,) or (n_series, n_steps)
+
+    b1 : float, np.array
+        parameter
+
+    b2 : float, np.array
+        parameter to exponentially weigh the precipitation backward in time
+
+    b3 : float, np.array
+        initial antecedent precipitation index
+
+    Returns
+    -------
+    prec_eff : np.array
+        effective precipitation of shape (n_params, n_steps) or
+        (n_params, n_series, n_steps)
+    """
+    prec = np.asarray(prec, dtype=float)
+    b1, b2, b3 = (np.atleast_1d(np.asarray(b, dtype=float)) for b in (b1, b2, b3))
+    b1, b2, b3 = np.broadcast_arrays(b1, b2, b3)
+    n_params, n = len(b1), prec.shape[-1]
+    shape = (n_params,) + prec.shape
+    # scalar power as in loss_function, the vectorized power of arrays may
+    # differ in the last bit
+    a = np.array([1 - b**-1 for b in b2])
+
+    if n_params * prec.size // max(n, 1) > n:
+        # more parameter sets and series than time steps: recursion over
+        # time steps, vectorized over parameter sets and series
+        expand = (slice(None),) + (np.newaxis,) * (prec.ndim - 1)
+        b1, a, s_t = b1[expand], a[expand], (a * b3)[expand]
+        s_t = np.broadcast_to(s_t, shape[:-1]).copy()
+        prec_eff = np.zeros(shape)
+        for t in range(n):
+            s_t = b1 * prec[..., t] + s_t
+            prec_eff[..., t] = prec[..., t] * s_t
+            s_t = a * s_t
+    else:
+        prec_eff = np.zeros(shape)
+        for i in range(n_params):
+            prec_eff[i] = loss_function(prec, b1[i], b2[i], b3[i])
+
+    return prec_eff
+
+
+def simulate(input, g, dtau, engine="auto", method="auto", tol=None, full_output=False, at=None, window=None,
+             **kwargs):
+    """Runs simulation of transport model
+
+    Args
+    ----
+    input : np.array, list
+        input signal. Multiple input signals can be simulated at once by
+        passing an array of shape (n_sites, n_steps) or a list of input
+        signals which may differ in length.
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    engine : str, optional
+        simulation engine (`convolution`, `recursive`, `cascade`, `delay`,
+        `spectral`, `composite`, `prony` or `auto`). If `auto`, the recursive engine
+        is used for the linear reservoir and parallel linear reservoir
+        transfer functions, the cascade engine for the gamma transfer
+        function with an integer shape parameter, the delay engine for the
+        exponential-piston transfer function, the composite engine for
+        composite transfer functions (see :mod:`transep.composite`) with
+        parts that can be evaluated without convolution and the convolution
+        engine otherwise.
+
+    method : str, optional
+        convolution method (`direct`, `fft`, `overlap-add`, `sparse` or
+        `auto`). Sparse input signals (e.g. a tracer injection) are detected
+        by `auto`.
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        by the convolution engine (see :func:`truncate_kernel`) and maximum
+        L1 error of the transfer function approximated by the prony engine
+        (see :func:`prony_integral`, 1e-3 by default). The other engines are
+        exact and do not truncate the transfer function.
+
+    full_output : bool, optional
+        if True, information on the simulation is returned as well
+
+    at : np.array, optional
+        time step indices or boolean mask of the output values which are
+        calculated, e.g. the sampling days of observations. The convolution
+        engine calculates only these values, either by dot products (few
+        time steps) or by a convolution over the window spanned by the time
+        steps (many time steps). The other engines calculate all values.
+
+    window : tuple, optional
+        first and last (exclusive) time step index `(t0, t1)` of the output
+        values which are calculated, e.g. a validation period. Only the
+        input values up to `t1` are read. The convolution engine calculates
+        only the values within the window from the input values within one
+        length of the (truncated) transfer function before the window, so
+        its cost does not depend on the length of the record.
+
+    Returns
+    -------
+    fout : np.array, list
+        output signal. A list of output signals is returned if a list of
+        input signals has been passed.
+
+    info : dict
+        selected engine (`engine`), convolution method (`method`), length of
+        the truncated transfer function (`n_kernel`) and dropped mass
+        (`dropped_mass`). Only returned if `full_output` is True.
+    """
+    lengths = None
+    if isinstance(input, (list, tuple)) and len(input) > 0 and np.ndim(input[0]) > 0:
+        input, lengths = _pad_series(input)
+    else:
+        input = np.asarray(input, dtype=float)
+
+    if engine == "auto":
+        engine = _select_engine(g, **kwargs)
+
+    if (at is not None or window is not None) and lengths is not None:
+        raise ValueError("Output time steps cannot be selected for input signals of different length.")
+    if window is not None:
+        if at is not None:
+            raise ValueError("Output time steps are selected by either `at` or `window`.")
+        at = _window_index(window, input.shape[-1])
+        # later input values do not affect the output of the window
+        input = input[..., :at[-1] + 1 if at.size > 0 else 0]
+
+    info = {"engine": engine, "method": None, "n_kernel": None, "dropped_mass": 0.0}
+    if engine == "convolution":
+        out, conv_info = convolution_integral(input, g, dtau, method=method, tol=tol, full_output=True, at=at, **kwargs)
+        info.update(conv_info)
+        at = None
+    elif engine == "recursive":
+        out = recursive_integral(input, g, dtau, **kwargs)
+    elif engine == "cascade":
+        out = cascade_integral(input, g, dtau, method=method, **kwargs)
+    elif engine == "delay":
+        out = delay_integral(input, g, dtau, **kwargs)
+    elif engine == "spectral":
+        out = spectral_integral(input, g, dtau, tol=tol, **kwargs)
+    elif engine == "prony":
+        out = prony_integral(input, g, dtau, tol=1e-3 if tol is None else tol, method=method, **kwargs)
+    elif engine == "composite":
+        if not isinstance(g, composite.Composite):
+            raise ValueError(f"Transfer function '{g.__name__}' is not a composite transfer function.")
+        out = g.integral(input, dtau, method=method, tol=tol)
+    else:
+        raise ValueError(f"Unknown engine '{engine}'. Choose from {ENGINES}.")
+
+    if at is not None:
+        out = out[..., at]
+    if lengths is not None:
+        out = [row[:n] for row, n in zip(out, lengths)]
+
+    if full_output:
+        return out, info
+
+    return out
+
+
+def simulate_batch(input, g, dtau, params, batch_size=1024, tol=None, spectral=False):
+    """Runs simulation of transport model for many parameter sets
+
+    The spectrum of the input signal is calculated once and multiplied with
+    the spectra of the transfer functions of all parameter sets. The
+    parameter sets are processed in batches to limit memory usage.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function which broadcasts array-valued parameters to
+        shape (n_params, n_steps) like the built-in transfer functions
+
+    dtau : int, float
+        incremental time step
+
+    params : dict
+        parameters of transfer function. Values are either scalars or
+        arrays of length n_params.
+
+    batch_size : int, optional
+        number of parameter sets which are evaluated at once
+
+    tol : float, optional
+        maximum mass of the tail of the transfer functions which is dropped
+        (see :func:`truncate_kernel`)
+
+    spectral : bool, optional
+        if True, the spectra of the linear reservoir and exponential-piston
+        transfer functions are evaluated in closed form (see
+        :func:`kernel_spectrum`) instead of sampling and transforming the
+        transfer functions
+
+    Returns
+    -------
+    fout : np.array
+        output signals of shape (n_params, n_steps)
+    """
+    input = np.asarray(input, dtype=float)
+    params = _batch_parameters(params)
+    n_params = len(next(iter(params.values()))) if params else 1
+    n = input.shape[-1]
+    batches = [{name: value[start:start + batch_size] for name, value in params.items()}
+               for start in range(0, n_params, batch_size)]
+    n_kernel = n
+    if tol is not None:
+        # all transfer functions are truncated at the same length
+        n_kernel = max(truncate_kernel(g, n, tol=tol, **batch)[0].shape[-1] for batch in batches)
+    t = np.arange(1, n_kernel + 1, dtype=float)
+    spectrum, nfft = convolution.rfft_input(input, n_kernel)
+    out = np.zeros((n_params, n))
+    for i, batch in enumerate(batches):
+        if spectral:
+            spec = spectrum * kernel_spectrum(g, nfft, n_kernel, **batch)
+            out[i * batch_size:(i + 1) * batch_size] = sp_fft.irfft(spec, nfft, axis=-1)[..., :n] * dtau
+        else:
+            gout = g(t, **batch)
+            out[i * batch_size:(i + 1) * batch_size] = convolution.convolve_spectrum(spectrum, gout, n, nfft) * dtau
+
+    return out
+
+
+def simulate_models(input, dtau, models, tol=None):
+    """Runs simulation of several transport models with the same input signal
+
+    Transfer functions which are evaluated by the recursive, cascade or
+    delay engine are simulated without convolution. The spectrum of the
+    input signal is calculated once and multiplied with the spectra of the
+    remaining transfer functions.
+
+    Args
+    ----
+    input : np.array
+        input signal of shape (n_steps,) or (n_sites, n_steps)
+
+    dtau : int, float
+        incremental time step
+
+    models : dict
+        transfer function and dictionary of its parameters of each model,
+        e.g. `{"dm": (dispersion_function, {"p_d": 0.1, "mtt": 100})}`
+
+    tol : float, optional
+        maximum mass of the tail of the transfer functions which is dropped
+        (see :func:`truncate_kernel`)
+
+    Returns
+    -------
+    fout : dict
+        output signal of each model
+    """
+    input = np.asarray(input, dtype=float)
+    n = input.shape[-1]
+    out = {}
+    kernels = {}
+    for name, (g, params) in models.items():
+        engine = _select_engine(g, **params)
+        if engine == "convolution":
+            kernels[name], _ = truncate_kernel(g, n, tol=tol, **params)
+        else:
+            out[name] = simulate(input, g, dtau, engine=engine, **params)
+
+    if kernels:
+        n_kernel = max(gout.shape[-1] for gout in kernels.values())
+        spectrum, nfft = convolution.rfft_input(input, n_kernel)
+        for name, gout in kernels.items():
+            out[name] = convolution.convolve_spectrum(spectrum, gout, n, nfft) * dtau
+
+    return {name: out[name] for name in models}
+
+
+def simulate_with_jacobian(input, g, dtau, tol=None, **kwargs):
+    """Runs simulation of transport model and calculates the sensitivities
+    of the output signal to the parameters
+
+    The derivative of the output signal with respect to a parameter is the
+    convolution of the input signal with the derivative of the transfer
+    function (see e.g. :func:`dispersion_derivatives`). The transfer
+    function and its derivatives are convolved with the same spectrum of
+    the input signal in a single batched FFT.
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        built-in transfer function
+
+    dtau : int, float
+        incremental time step
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`truncate_kernel`)
+
+    Returns
+    -------
+    fout : np.array
+        output signal
+
+    jacobian : dict
+        derivative of output signal with respect to each parameter
+    """
+    derivative_function = _derivative_function(g)
+    if derivative_function is None:
+        raise ValueError(f"Transfer function '{g.__name__}' has no analytic derivatives.")
+    input = np.asarray(input, dtype=float)
+    n = input.shape[-1]
+    gout, _ = truncate_kernel(g, n, tol=tol, **kwargs)
+    t = np.arange(1, gout.shape[-1] + 1, dtype=float)
+    derivatives = derivative_function(t, **kwargs)
+    kernels = np.stack([gout] + list(derivatives.values()))
+    spectrum, nfft = convolution.rfft_input(input, gout.shape[-1])
+    out = convolution.convolve_spectrum(spectrum, kernels, n, nfft) * dtau
+
+    return out[0], dict(zip(derivatives, out[1:]))
+
+
+def plan(n_steps, g, dtau, method="auto", tol=None, **kwargs):
+    """Prepares the simulation of input signals with a fixed length and
+    fixed parameters
+
+    The transfer function is sampled (and truncated) once and its spectrum
+    and the work buffers are cached by the returned plan. The simulation is
+    then run by `plan.run(input, out=...)` without repeating the setup,
+    e.g. for ensembles of input signals with fixed parameters.
+
+    Args
+    ----
+    n_steps : int
+        number of time steps of input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    method : str, optional
+        convolution method (`direct`, `fft`, `overlap-add`, `sparse` or
+        `auto`)
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`truncate_kernel`)
+
+    Returns
+    -------
+    plan : transep.convolution.ConvolutionPlan
+        simulation plan
+    """
+    gout, _ = truncate_kernel(g, n_steps, tol=tol, **kwargs)
+
+    return convolution.ConvolutionPlan(n_steps, gout, method=method, scale=dtau)
+
+
+def simulate_stream(chunks, g, dtau, n_kernel, tol=None, block_size=None, **kwargs):
+    """Runs simulation of transport model for a stream of input chunks
+
+    The input signal is consumed chunk by chunk (e.g. from a sensor stream
+    or a file reader) and convolved by overlap-save with the transfer
+    function sampled at t = 1, ..., `n_kernel`. Memory usage is
+    proportional to the length of the chunks plus `n_kernel`, regardless of
+    the length of the record. The concatenated output is identical to
+    :func:`simulate` if `n_kernel` is not shorter than the record and
+    otherwise corresponds to a transfer function truncated at `n_kernel`.
+
+    Args
+    ----
+    chunks : iterable
+        chunks of input signal of shape (len(chunk),) or
+        (n_sites, len(chunk))
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    n_kernel : int
+        maximum length of transfer function
+
+    tol : float, optional
+        maximum mass of the tail of the transfer function which is dropped
+        (see :func:`truncate_kernel`)
+
+    block_size : int, optional
+        maximum number of time steps which are convolved at once
+
+    Yields
+    ------
+    fout : np.array
+        chunk of output signal with the same length as the input chunk
+    """
+    gout, _ = truncate_kernel(g, n_kernel, tol=tol, **kwargs)
+    for out in convolution.overlap_save(chunks, gout, block_size=block_size):
+        yield out * dtau
+
+
+def simulate_explicit(input, g, dtau, weight=None, **kwargs):
+    """Runs simulation of transport model
+
+    Args
+    ----
+    input : np.array
+        input signal
+
+    g : function
+        transfer function
+
+    dtau : int, float
+        incremental time step
+
+    weight : np.array, optional
+        weight of input signal (e.g. flux)
 
     Returns
     -------
     fout : np.array
         output signal
     """
-    out = convolution_integral_explicit(input, g, dtau, **kwargs)
+    out = convolution_integral_explicit(input, g, dtau, weight=weight, **kwargs)
 
     return out